@@ -39,19 +39,17 @@ def format_size(
     Returns:
         str: formated string.
     """
-    factor = 1024
-    units = ["B", "K", "M", "G", "T", "P", "E", "Z"]
+    units = ["B", "K", "M", "G", "T", "P", "E", "Z", "Y"]
 
     if unit:
-        if unit not in units:
-            raise ValueError(f"unit {unit} not in {units}")
+        if unit not in units[:-1]:
+            raise ValueError(f"unit {unit} not in {units[:-1]}")
         suffix = f"{unit}{suffix}" if suffix else ""
-        nbytes = nbytes if unit == "B" else nbytes / factor ** (units.index(unit))
+        index = units.index(unit)
+        nbytes = nbytes / (1 << (10 * index)) if index else nbytes
         return f"{round(nbytes, ndigits)} {suffix}"
     else:
-        units[0] = ""
-        for unit in units:
-            if nbytes < factor:
-                return f"{round(nbytes, ndigits)} {unit}{suffix}"
-            nbytes /= factor
-    return f"{round(nbytes, ndigits)} Y{suffix}"
+        # each unit is a 2**10 step, so its index is given by the bit length
+        index = min(max(0, (int(abs(nbytes)).bit_length() - 1) // 10), 8)
+        nbytes = nbytes / (1 << (10 * index)) if index else nbytes
+        return f"{round(nbytes, ndigits)} {units[index] if index else ''}{suffix}"
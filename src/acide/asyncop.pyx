@@ -25,6 +25,7 @@ as an interface with glib.
 
 import asyncio
 import functools
+import logging
 from typing import Any, Awaitable, Callable, Coroutine, Optional
 from enum import Enum, IntEnum, unique, auto
 
@@ -35,6 +36,8 @@ cimport cython
 
 AsyncReadyCallback = Callable[[Any, Gio.Task, Any], None]
 
+_LOG = logging.getLogger(__name__)
+
 
 @unique
 class Run(Enum):
@@ -329,7 +332,7 @@ cdef class Scheduler():
             return
 
     async def run_once(self)  -> Coroutine:
-        print("run_once")
+        _LOG.debug("run_once")
         # try:
         #     loop = asyncio.get_running_loop()
         #     self.loop_run = True
@@ -347,7 +350,7 @@ cdef class Scheduler():
         #     self.loop_run = False
 
     async def run_until_complete(self)  -> Coroutine:
-        print("run_until_complete")
+        _LOG.debug("run_until_complete")
         # try:
         #     loop = asyncio.get_running_loop()
         #     self.loop_run = True
@@ -386,7 +389,7 @@ cdef class Scheduler():
             else:
                 raise ValueError(f"Unavailable mode {mode}")
         else:
-            print("scheduler already running")
+            _LOG.debug("scheduler already running")
 
     def stop(self) -> None:
         """Stop the :class:`Scheduler`'s loop at the end of the current iteration."""
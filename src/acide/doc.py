@@ -54,8 +54,13 @@ encounter a situation like this one:
     * BUT: page.cropbox = Rect(36.0, 0.0, 607.5, 720.0), because the two y-coordinates
       have been transformed (45 subtracted from both of them).
 """
+import logging
+import os
+import threading
+from collections import OrderedDict
+from operator import attrgetter
 from pathlib import Path
-from typing import List, Union, Optional, Any, Sequence
+from typing import List, Union, Optional, Any, Sequence, Tuple, Dict, Callable
 
 import gi
 gi.require_version('Graphene', '1.0')
@@ -65,11 +70,166 @@ from gi.repository import Gdk, GLib, GObject, Graphene
 
 import fitz
 
+from acide import format_size
 from acide.graphic import Graphic
 from acide.measure import Unit, Measurable
+from acide.store import TileStore
 from acide.types import BufferProtocol, Pixbuf
 
 
+PIXBUF_CACHE_SIZE = 2**28
+PIXBUF_CACHE_RATIO = 0.05
+DISPLAYLIST_CACHE_SIZE = 16
+
+_LOG = logging.getLogger(__name__)
+
+
+def pixbuf_cache_budget() -> int:
+    """Returns a size in bytes for a pixbufs cache.
+
+    This is :obj:`PIXBUF_CACHE_RATIO` of the available physical memory,
+    limited to :obj:`PIXBUF_CACHE_SIZE`. If the available memory couldn't
+    be queried, :obj:`PIXBUF_CACHE_SIZE` is returned.
+    """
+    try:
+        available = os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (AttributeError, ValueError, OSError):
+        return PIXBUF_CACHE_SIZE
+    return min(int(available * PIXBUF_CACHE_RATIO), PIXBUF_CACHE_SIZE)
+
+
+def _to_graphene_rect(rect: fitz.Rect) -> Graphene.Rect:
+    return Graphene.Rect().init(rect.x0, rect.y0, rect.width, rect.height)
+
+
+class PixbufCache():
+    """A least recently used cache of pixbufs bounded by a size in bytes.
+
+    A :class:`Document` owns a single cache shared by its pages, their
+    keys start with the page number, so rendered regions of every page
+    share one budget and one eviction order. Pixbufs evicted are written
+    to an optional :class:`acide.store.TileStore`, where :meth:`get`
+    could still find them. This class is thread safe.
+
+    Args:
+        size: an :class:`int` as the maximum size in bytes of the cache.
+              If None, default, the size is given by
+              :func:`pixbuf_cache_budget` and updated by :meth:`update_size`.
+        store: an optional :class:`acide.store.TileStore`.
+    """
+
+    def __init__(
+        self, size: Optional[int] = None, store: Optional[TileStore] = None
+    ) -> 'PixbufCache':
+        if size is not None and size < 0:
+            raise ValueError("size should be positive")
+        self._items: OrderedDict = OrderedDict()
+        self._auto_size = size is None
+        self._size = pixbuf_cache_budget() if size is None else size
+        self._nbytes = 0
+        self._lock = threading.Lock()
+        self._store = store
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __str__(self) -> str:
+        return (
+            f"pixbufs cache: {len(self._items)} items, "
+            f"{format_size(self._nbytes)} / {format_size(self._size)}"
+        )
+
+    def get(self, key: Tuple) -> Optional[Pixbuf]:
+        """Returns the :class:`acide.types.Pixbuf` cached for :obj:`key`,
+        or None if neither this cache nor its store hold it."""
+        with self._lock:
+            pixbuf = self._items.get(key)
+            if pixbuf is not None:
+                self._items.move_to_end(key)
+                return pixbuf
+        if self._store is not None:
+            pixbuf = self._store.get(key)
+            if pixbuf is not None:
+                # buffer is a copy, it could go back in the cache
+                self.put(key, pixbuf)
+        return pixbuf
+
+    def put(self, key: Tuple, pixbuf: Pixbuf) -> None:
+        """Cache :obj:`pixbuf` for :obj:`key`, evicting the least
+        recently used pixbufs past the size of this cache."""
+        nbytes = len(pixbuf.buffer)
+        evicted = []
+        if nbytes > self._size:
+            evicted.append((key, pixbuf))
+        else:
+            with self._lock:
+                if key in self._items:
+                    return
+                self._items[key] = pixbuf
+                self._nbytes += nbytes
+                while self._nbytes > self._size:
+                    old_key, old = self._items.popitem(last=False)
+                    self._nbytes -= len(old.buffer)
+                    evicted.append((old_key, old))
+        # pixbufs are only copied to the store when leaving the cache,
+        # out of the cache lock.
+        if self._store is not None:
+            for old_key, old in evicted:
+                self._store.put(old_key, old)
+
+    def update_size(self) -> None:
+        """Update the size of this cache from :func:`pixbuf_cache_budget`,
+        if it was not given at initialization."""
+        if self._auto_size:
+            self._size = pixbuf_cache_budget()
+
+    def clear(self, number: Optional[int] = None) -> None:
+        """Drop the cached pixbufs, or only the ones of
+        the page :obj:`number` if given."""
+        with self._lock:
+            if number is None:
+                self._items.clear()
+                self._nbytes = 0
+                return
+            for key in [k for k in self._items if k[0] == number]:
+                self._nbytes -= len(self._items.pop(key).buffer)
+
+
+class PixmapScratch():
+    """A :class:`fitz.Pixmap` reused to render the pages of a document.
+
+    Tiles of a same scale share mostly the same size, from any page, so
+    a single pixmap is moved and cleared for each of them instead of
+    allocating a new buffer. PyMuPDF keeps the GIL while rasterizing,
+    rendering is serialized by :attr:`lock`, which should be held while
+    the pixmap returned by :meth:`get_pixmap` is in use.
+    """
+
+    def __init__(self) -> 'PixmapScratch':
+        self.lock = threading.Lock()
+        self._pixmap: Optional[fitz.Pixmap] = None
+        self._cs = fitz.Colorspace(fitz.CS_RGB)
+
+    def get_pixmap(self, irect: fitz.IRect) -> fitz.Pixmap:
+        """Returns a cleared :class:`fitz.Pixmap` covering :obj:`irect`,
+        reallocated only when the size of :obj:`irect` changes."""
+        pxm = self._pixmap
+        if (
+            pxm is None or pxm.width != irect.width or \
+            pxm.height != irect.height
+        ):
+            pxm = self._pixmap = fitz.Pixmap(self._cs, irect, True)
+        else:
+            pxm.set_origin(irect.x0, irect.y0)
+        pxm.clear_with()
+        return pxm
+
+    def clear(self) -> None:
+        """Release the pixmap."""
+        with self.lock:
+            self._pixmap = None
+
+
 class Document():
     """Acide Document.
 
@@ -112,17 +272,131 @@ class Document():
     If you e.g. created a table of contents by toc = doc.get_toc(), and later
     close or change the document, then this cannot and does not change variable
     toc in any way. It is your responsibility to refresh such variables as required.
+
+    Args:
+        file: the path of the pdf file to open.
+        store_size: an optional :class:`int` as the size in bytes of
+                    an :class:`acide.store.TileStore` shared by pages,
+                    if None, default, pages have no disk backed store.
+        store_path: an optional directory where the store backing file
+                    is created, default to the system temporary directory.
     """
-    def __init__(self, file: Path = None) -> 'Document':
+    def __init__(
+        self,
+        file: Path = None,
+        store_size: Optional[int] = None,
+        store_path: Optional[Path] = None,
+    ) -> 'Document':
         self._pdf: fitz.Document = fitz.open(file)
         self._pages: List[fitz.Page] = []
         self._current = 0
-        self._graphic_page = Page(self._pdf.load_page(self._current))
-        print(fitz.TOOLS.mupdf_warnings())
+        # the disk backed store is opt-in, its temporary file
+        # is resident memory when the temporary directory is a tmpfs.
+        self._store: Optional[TileStore] = (
+            TileStore(store_size, store_path) if store_size else None
+        )
+        # rendered pixbufs of all pages share one budget
+        self._cache = PixbufCache(store=self._store)
+        # pages are rendered one at a time in a single pixmap
+        self._scratch = PixmapScratch()
+        self._dl_cache: OrderedDict = OrderedDict()
+        # parsing the pdf and building the display list of the current page
+        # is the costly part, it could be done from any thread. Pages are
+        # GObjects scheduling main loop sources, they are built by
+        # get_graphic() from the main thread.
+        self.get_displaylist(self._current)
+        self._graphic_page = None
+        self._preload_source = None
+        if _LOG.isEnabledFor(logging.DEBUG):
+            _LOG.debug("mupdf warnings: %s", fitz.TOOLS.mupdf_warnings())
+
+    def get_displaylist(
+        self, index: int, page: Optional[fitz.Page] = None
+    ) -> fitz.DisplayList:
+        """Get the :class:`fitz.DisplayList` of the page at :obj:`index`.
+
+        Display lists are kept in a least recently used cache of
+        :obj:`DISPLAYLIST_CACHE_SIZE` items, so the page content stream
+        is not interpreted again when revisiting a page.
+
+        Args:
+            index: an :class:`int` as the page number.
+            page: the :class:`fitz.Page` at :obj:`index` if already loaded.
+        """
+        dl = self._dl_cache.get(index)
+        if dl is not None:
+            self._dl_cache.move_to_end(index)
+            return dl
+        page = page if page is not None else self._pdf.load_page(index)
+        dl = self._dl_cache[index] = page.get_displaylist()
+        while len(self._dl_cache) > DISPLAYLIST_CACHE_SIZE:
+            self._dl_cache.popitem(last=False)
+        return dl
+
+    def preload_neighbours(self) -> None:
+        """Build the display lists of the pages around the current one
+        when the main loop is idle, so turning a page doesn't have to
+        interpret its content stream first."""
+        if self._preload_source is not None:
+            GLib.source_remove(self._preload_source)
+        pending = [
+            index for index in (self._current + 1, self._current - 1)
+            if 0 <= index < self._pdf.page_count
+        ]
+        self._preload_source = GLib.idle_add(
+            self._preload_displaylist, pending, priority=GLib.PRIORITY_LOW
+        )
 
-    def get_graphic(self):
+    def _preload_displaylist(self, pending: List[int]) -> bool:
+        # one page per idle call, the main loop stays responsive
+        if pending:
+            self.get_displaylist(pending.pop(0))
+        if pending:
+            return GLib.SOURCE_CONTINUE
+        self._preload_source = None
+        return GLib.SOURCE_REMOVE
+
+    def get_page(self, index: int) -> 'Page':
+        """Build a :class:`Page` for the page at :obj:`index`."""
+        page = self._pdf.load_page(index)
+        return Page(
+            page,
+            displaylist=self.get_displaylist(index, page),
+            cache=self._cache,
+            scratch=self._scratch,
+        )
+
+    def get_graphic(self) -> 'Page':
+        """Returns the :class:`Page` of the current page.
+
+        The :class:`Page` is built on first call, this should be called
+        from the main thread.
+        """
+        if self._graphic_page is None:
+            self._graphic_page = self.get_page(self._current)
         return self._graphic_page
 
+    def close(self) -> None:
+        """Release resources held by this :class:`Document`.
+
+        The pages built by :meth:`get_page` are disposed, the display lists
+        and pixbufs caches and the tiles store are dropped before closing the underlying
+        :class:`fitz.Document`. The :class:`Document` should not be used after.
+        """
+        if self._preload_source is not None:
+            GLib.source_remove(self._preload_source)
+            self._preload_source = None
+        if self._graphic_page is not None:
+            self._graphic_page.dispose()
+            self._graphic_page = None
+        self._dl_cache.clear()
+        self._cache.clear()
+        self._scratch.clear()
+        if self._store is not None:
+            self._store.close()
+            self._store = None
+        self._pdf.close()
+
     def next_page(self):
         pass
 
@@ -138,6 +412,32 @@ class Document():
 
 class Page(Graphic):
     """Page Document.
+
+    Pixbufs rendered by :meth:`get_pixbuf` are kept in a least recently
+    used :class:`PixbufCache`, so regions already rasterized by MuPDF
+    are returned without rendering them again when panning or zooming
+    back. Pages built by a :class:`Document` share its cache.
+
+    :meth:`get_pixbuf` is thread safe. Cache lookups run concurrently,
+    rendering is serialized on the single :class:`fitz.DisplayList` of
+    the page by the lock of a :class:`PixmapScratch`, shared by the pages
+    of a :class:`Document`, as PyMuPDF keeps the GIL while rasterizing.
+
+    Args:
+        page: the :class:`fitz.Page` to render.
+        cache_size: an :class:`int` as the maximum size in bytes of
+                    the pixbufs cache. If None, default, the size is given
+                    by :func:`pixbuf_cache_budget` and updated
+                    in :meth:`on_updated`. Ignored if :obj:`cache` is given.
+        store: an optional :class:`acide.store.TileStore` where pixbufs
+               evicted from the cache are written. Ignored if :obj:`cache`
+               is given.
+        displaylist: an optional :class:`fitz.DisplayList` of :obj:`page`,
+                     if None it will be created from :obj:`page`.
+        cache: an optional :class:`PixbufCache` shared with other pages,
+               if None, default, the page has its own cache.
+        scratch: an optional :class:`PixmapScratch` shared with other pages,
+                 if None, default, the page has its own.
     """
 
     __gtype_name__ = "Page"
@@ -176,29 +476,59 @@ class Page(Graphic):
         ),
     }
 
-    def do_get_property(self, prop: str) -> any:
-        if prop.name == 'cropbox':
-            return self.cropbox
-        elif prop.name == 'artbox':
-            return self.artbox
-        elif prop.name == 'bleedbox':
-            return self.bleedbox
-        else:
-            raise AttributeError(f'unknown property {prop.name}')
+    _GETTERS = {
+        name: attrgetter(f"_{name}")
+        for name in ('mediabox', 'cropbox', 'artbox', 'bleedbox', 'trimbox')
+    }
 
-    def __init__(self, page: fitz.Page) -> 'Page':
+    def do_get_property(self, prop: str) -> any:
+        try:
+            return self._GETTERS[prop.name](self)
+        except KeyError:
+            raise AttributeError(f'unknown property {prop.name}') from None
+
+    def __init__(
+        self,
+        page: fitz.Page,
+        cache_size: Optional[int] = None,
+        store: Optional[TileStore] = None,
+        displaylist: Optional[fitz.DisplayList] = None,
+        cache: Optional[PixbufCache] = None,
+        scratch: Optional[PixmapScratch] = None,
+    ) -> 'Page':
         if not isinstance(page, fitz.Page):
             raise TypeError(
                 f"page should be a fitz.Page not {page.__class__.__name__}"
             )
-        self._page = page
-        self._displaylist: fitz.DisplayList = page.get_displaylist()
-        self._cs = fitz.Colorspace(fitz.CS_RGB)
+        # GObject is initialized once, by Graphic, before setting
+        # any attribute of the Page
         super().__init__(
             rect=(page.rect.x0, page.rect.y0, page.rect.width, page.rect.height),
-            mem_format=Gdk.MemoryFormat.R8G8B8,
+            mem_format=Gdk.MemoryFormat.R8G8B8A8_PREMULTIPLIED,
             unit=Unit.PS_POINT,
         )
+        self._page = page
+        self._number = page.number
+        # boxes are read once, fitz parses the page dictionary on each access
+        self._mediabox = _to_graphene_rect(page.mediabox)
+        self._cropbox = _to_graphene_rect(page.cropbox)
+        self._artbox = _to_graphene_rect(page.artbox)
+        self._bleedbox = _to_graphene_rect(page.bleedbox)
+        self._trimbox = _to_graphene_rect(page.trimbox)
+        self._own_cache = cache is None
+        self._cache: PixbufCache = (
+            PixbufCache(cache_size, store) if cache is None else cache
+        )
+        self._displaylist: fitz.DisplayList = (
+            displaylist if displaylist is not None else page.get_displaylist()
+        )
+        # PyMuPDF holds the GIL while rasterizing, rendering threads
+        # couldn't run MuPDF in parallel, they share the display list
+        # of the page and the scratch pixmap behind its lock.
+        self._own_scratch = scratch is None
+        self._scratch = PixmapScratch() if scratch is None else scratch
+        self._render_lock = self._scratch.lock
+        self._renderers: Dict[Tuple[int, float], Callable] = {}
 
     def on_added(self, viewport: Measurable) -> None:
         super().on_added(viewport)
@@ -206,18 +536,97 @@ class Page(Graphic):
 
     def on_updated(self) -> None:
         self.dpi = self.viewport.dpi
+        # cached pixbufs and renderers are keyed by dpi, the ones of
+        # a previous dpi are kept for when it comes back (eg: a scale
+        # factor flip) and are evicted by the cache when not used.
+        self._cache.update_size()
         super().on_updated()
 
+    def clear_cache(self) -> None:
+        """Drop the pixbufs of this page kept in the rendering cache."""
+        self._cache.clear(self._number)
+
+    def dispose(self) -> None:
+        """Drop the renderers and display lists of this :class:`Page`, and
+        its cached pixbufs unless the cache is shared with other pages.
+
+        This should be called before the owning :class:`fitz.Document`
+        is closed, the :class:`Page` should not be rendered after.
+        """
+        self._renderers.clear()
+        if self._own_cache:
+            self._cache.clear()
+        with self._render_lock:
+            self._displaylist = None
+        if self._own_scratch:
+            self._scratch.clear()
+
+    def _get_displaylist(self) -> fitz.DisplayList:
+        # called with the render lock held
+        dl = self._displaylist
+        if dl is None:
+            dl = self._displaylist = self._page.get_displaylist()
+        return dl
+
     def get_pixbuf(self, rect: Graphene.Rect, scale: int) -> Pixbuf:
-        _tl = rect.get_top_left()
-        _br = rect.get_bottom_right()
-        _scale = (self.dpi * scale) / 72
-        pxm = self._displaylist.get_pixmap(
-            matrix=fitz.Matrix(_scale, _scale),
-            colorspace=self._cs,
-            alpha=False,
-            clip=fitz.Rect(_tl.x, _tl.y, _br.x, _br.y),
+        # scalar getters don't allocate Graphene.Point
+        x0 = rect.get_x()
+        y0 = rect.get_y()
+        x1 = x0 + rect.get_width()
+        y1 = y0 + rect.get_height()
+        # dpi is read once, a render started before a dpi change
+        # is cached under the dpi it was rendered for.
+        dpi = self.dpi
+        # the cache is shared by the pages of a document
+        key = (
+            self._number, round(x0, 2), round(y0, 2), round(x1, 2),
+            round(y1, 2), scale, dpi
         )
-        # return Pixbuf(pxm.samples_mv, pxm.width, pxm.height, pxm)
-        return Pixbuf(pxm.samples, pxm.width, pxm.height, pxm)
+        cache = self._cache
+        pixbuf = cache.get(key)
+        if pixbuf is not None:
+            return pixbuf
+
+        render = self._renderers.get((scale, dpi))
+        if render is None:
+            render = self._renderers[scale, dpi] = self._specialize(scale, dpi)
+        with self._render_lock:
+            # the same tile could be queued by several requests, it is
+            # only rendered by the first worker taking the lock.
+            pixbuf = cache.get(key)
+            if pixbuf is None:
+                pixbuf = render(x0, y0, x1, y1)
+                cache.put(key, pixbuf)
+        return pixbuf
+
+    def _specialize(
+        self, scale: int, dpi: float
+    ) -> Callable[[float, float, float, float], Pixbuf]:
+        # Build a rendering function with all constants for this scale
+        # and dpi bound as closure's locals.
+        _scale = (dpi * scale) / 72
+        matrix = fitz.Matrix(_scale, _scale)
+        get_displaylist = self._get_displaylist
+        get_pixmap = self._scratch.get_pixmap
+        Rect = fitz.Rect
+        Device = fitz.Device
+
+        def render(x0: float, y0: float, x1: float, y1: float) -> Pixbuf:
+            # This is what DisplayList.get_pixmap() does, but drawing
+            # in a reused pixmap instead of allocating a new one.
+            # MuPDF pixmaps with alpha are premultiplied, this is
+            # the layout Gdk textures are natively stored in.
+            # Called with the render lock held.
+            dl = get_displaylist()
+            area = (Rect(x0, y0, x1, y1) & dl.rect) * matrix
+            pxm = get_pixmap(area.round())
+            dl.run(Device(pxm, None), matrix, area)
+            # samples is a copy, pxm could safely be reused
+            return Pixbuf(pxm.samples, pxm.width, pxm.height)
+
+        return render
+
+    def cache_info(self) -> str:
+        """Returns a string describing the rendering cache usage."""
+        return str(self._cache)
 
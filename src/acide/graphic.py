@@ -16,9 +16,11 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 
+import functools
 from abc import ABCMeta, abstractmethod
+from concurrent.futures import Future, ThreadPoolExecutor
 from fractions import Fraction
-from typing import Union, Any, Callable
+from typing import Union, Any, Callable, List
 
 import gi
 gi.require_version("Gdk", "4.0")
@@ -28,7 +30,8 @@ from gi.repository import Gdk, GLib, Gio, GObject, Graphene
 from acide.measure import Measurable, GObjectMeasurableMeta, Unit
 from acide.types import Number, Rectangle, Pixbuf
 from acide.asyncop import AsyncReadyCallback
-from acide.tiles import TilesPool, SuperTile, Clip
+from acide.tiles import TilesPool, SuperTile, Clip, Tile
+from acide.tiles import gdk_memory_format_sizes
 from acide import format_size
 
 
@@ -36,6 +39,9 @@ class _GraphicMeta(ABCMeta, GObjectMeasurableMeta):
     pass
 
 RENDER_SHAPE = (3, 3)
+DEFAULT_SCALES = (1, 2, 4, 8, 16, 32)
+# shared by reference between Graphics using the default scales
+_DEFAULT_FRACTIONS = tuple(Fraction(f) for f in DEFAULT_SCALES)
 
 class Graphic(GObject.GObject, Measurable, metaclass=_GraphicMeta):
     """Graphic Interface, extends :class:`GObject` implements
@@ -49,7 +55,8 @@ class Graphic(GObject.GObject, Measurable, metaclass=_GraphicMeta):
     Args:
         rect: A four length Sequence of numbers (x, y, width, height)
               or a :class:`Graphen.Rect` as the dimension of this :class:`Graphic`.
-        mem_format: a enum's member of :class:`Gdk.MemoryFormat`
+        mem_format: a enum's member of :class:`Gdk.MemoryFormat`, default to
+                    :attr:`Gdk.MemoryFormat.R8G8B8A8_PREMULTIPLIED`
         unit: A member of enumeration :class:`acide.measure.Unit` as the unit
               of measure for the dimension of this :class:`Graphic`, default
               to :attr:`acide.measure.Unit.PS_POINT`
@@ -61,10 +68,12 @@ class Graphic(GObject.GObject, Measurable, metaclass=_GraphicMeta):
         'scaled': (GObject.SIGNAL_RUN_FIRST, None, (int,))
     }
 
+    _executor = None
+
     def __init__(
         self,
         rect: Rectangle,
-        mem_format: Gdk.MemoryFormat,
+        mem_format: Gdk.MemoryFormat = Gdk.MemoryFormat.R8G8B8A8_PREMULTIPLIED,
         unit: Unit = Unit.PS_POINT
     ):
         if not isinstance(mem_format, Gdk.MemoryFormat):
@@ -77,16 +86,45 @@ class Graphic(GObject.GObject, Measurable, metaclass=_GraphicMeta):
 
         self._viewport = None
         self._format = mem_format
-        self._init_scales((1, 2 , 4, 8, 16, 32))
-        self._scale_index = 0  # we start at 1:1
+        self._bpp = gdk_memory_format_sizes[mem_format]
+        self._init_scales(DEFAULT_SCALES)
+        self._set_scale_index(0)  # we start at 1:1
         self.tiles_pool = None
+        self._prefetch_source = None
+        self._preload_source = None
+        self._prefetch_futures: List[Future] = []
 
     def __str__(self):
         return f"Graphic({self._dump_props()})"
 
     def _init_scales(self, factors):
         # TODO: reduction factors
-        self._scales = [Fraction(f, 1) for f in factors]
+        if tuple(factors) == DEFAULT_SCALES:
+            self._fractions = _DEFAULT_FRACTIONS
+        else:
+            self._fractions = tuple(Fraction(f) for f in factors)
+        # scales are kept as (numerator, denominator) pairs of int
+        self._scales = [(f.numerator, f.denominator) for f in self._fractions]
+        self._factors = [num / den for num, den in self._scales]
+        self._scale_ints = tuple(int(f) for f in self._fractions)
+        self._scale_indices = {scl: i for i, scl in enumerate(self._scales)}
+        self._virtual_dpis = tuple(round(self.dpi * f) for f in self._fractions)
+        self._scale_index = -1
+
+    def _set_scale_index(self, index: int) -> bool:
+        # returns True if the scale index has changed
+        changed = index != self._scale_index
+        self._scale_index = index
+        self._scale = self._fractions[index]
+        self._scale_int = self._scale_ints[index]
+        self._scale_num, self._scale_den = self._scales[index]
+        return changed
+
+    def _apply_scale(self, index: int) -> Fraction:
+        # set the scale index and notify if it has changed
+        if self._set_scale_index(index):
+            self.emit("scaled", self._scale_int)
+        return self._scale
 
     def do_ready(self, state, *args):
         pass
@@ -99,7 +137,24 @@ class Graphic(GObject.GObject, Measurable, metaclass=_GraphicMeta):
         """The actual scale to apply when rendering on screen
         (this doesn't change the internal size of this :class:`Graphic`).
         """
-        return self._scales[self._scale_index]
+        return self._scale
+
+    @scale.setter
+    def scale(self, value: Union[int, Fraction]):
+        value = Fraction(value)
+        index = self._scale_indices.get((value.numerator, value.denominator))
+        if index is None:
+            raise ValueError(
+                f"scale should be one of the available scales not {value}"
+            )
+        self._apply_scale(index)
+
+    @property
+    def scale_int(self) -> int:
+        """The actual :attr:`scale` as an :class:`int`, cheaper to use
+        in rendering computations than a :class:`Fraction` (read only).
+        """
+        return self._scale_int
 
     def scale_increase(self) -> Fraction:
         """Increment the scale factor
@@ -107,10 +162,9 @@ class Graphic(GObject.GObject, Measurable, metaclass=_GraphicMeta):
         Returns:
             a :class:`Fraction` as the resulting current scale factor
         """
-        if self._scale_index + 1 < len(self._scales):
-            self._scale_index += 1
-        self.emit("scaled", self._scales[self._scale_index])
-        return self._scales[self._scale_index]
+        return self._apply_scale(
+            min(self._scale_index + 1, len(self._scales) - 1)
+        )
 
     def scale_decrease(self) -> Fraction:
         """Decrement the scale factor
@@ -118,10 +172,7 @@ class Graphic(GObject.GObject, Measurable, metaclass=_GraphicMeta):
         Returns:
             a :class:`Fraction` as the resulting current scale factor
         """
-        if self._scale_index - 1 >= 0:
-            self._scale_index -= 1
-        self.emit("scaled", self._scales[self._scale_index])
-        return self._scales[self._scale_index]
+        return self._apply_scale(max(self._scale_index - 1, 0))
 
     def scale_init(self) -> Fraction:
         """Set the scale factor to 1:1
@@ -129,9 +180,7 @@ class Graphic(GObject.GObject, Measurable, metaclass=_GraphicMeta):
         Returns:
             a :class:`Fraction` as the resulting current scale factor
         """
-        self._scale_index = 0
-        self.emit("scaled", self._scales[self._scale_index])
-        return self._scales[self._scale_index]
+        return self._apply_scale(0)
 
     def scale_fit(self) -> Fraction:
         """Set the scale factor so the :class:`Graphic` fit in the :obj:`viewport`
@@ -139,17 +188,42 @@ class Graphic(GObject.GObject, Measurable, metaclass=_GraphicMeta):
         Returns:
             a :class:`Fraction` as the resulting current scale factor
         """
-        self._scale_index = 0  # TODO: scale 2 fit
-        self.emit("scaled", self._scales[self._scale_index])
-        return self._scales[self._scale_index]
+        return self._apply_scale(0)  # TODO: scale 2 fit
 
     def virtual_dpi(self, scale: int = None) -> int:
         """The :attr:`scale` dependant dpi.
 
-        This is computed as round(self.dpi * self.scale) (read only).
+        This is round(self.dpi * self.scale), precomputed for each
+        available scales when :attr:`dpi` change (read only).
+        """
+        if scale:
+            return round(self.dpi * scale)
+        return self._virtual_dpis[self._scale_index]
+
+    @Measurable.dpi.setter
+    def dpi(self, value: Number):
+        Measurable.dpi.fset(self, value)
+        # virtual dpis are precomputed for each available scales
+        self._virtual_dpis = tuple(round(self.dpi * f) for f in self._fractions)
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """A :class:`concurrent.futures.ThreadPoolExecutor` shared by all
+        :class:`Graphic` instances and used to call :meth:`get_pixbuf`
+        out of the main loop (read only).
+
+        It has a single worker, rendering holds the GIL and more threads
+        would only contend for it. Prefetching jobs still queued are
+        cancelled when rendering is requested, so they don't delay
+        the tiles on screen.
+
+        Implementation of :meth:`get_pixbuf` should therefore be thread safe.
         """
-        scale = scale if scale else self._scales[self._scale_index]
-        return round(self.dpi * scale)
+        if Graphic._executor is None:
+            Graphic._executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="acide-render"
+            )
+        return Graphic._executor
 
     @property
     def mem_format(self) -> Gdk.MemoryFormat:
@@ -160,12 +234,22 @@ class Graphic(GObject.GObject, Measurable, metaclass=_GraphicMeta):
 
     @mem_format.setter
     def mem_format(self, value: Gdk.MemoryFormat):
-        if not isinstance(value, Gdk.MemoryFormat):
+        # the sizes mapping is keyed by Gdk.MemoryFormat members,
+        # a lookup is cheaper than an isinstance() on a GObject enum.
+        bpp = gdk_memory_format_sizes.get(value)
+        if bpp is None:
             raise TypeError(
-                "mem_format should be a mamber of Gdk.MemoryFormat "
-                f"not {format.__class__.__name__}"
+                "mem_format should be a member of Gdk.MemoryFormat "
+                f"not {value.__class__.__name__}"
             )
         self._format = value
+        self._bpp = bpp
+
+    @property
+    def bytes_per_pixel(self) -> int:
+        """An :class:`int` as the size in bytes of a pixel
+        for :attr:`mem_format` (read only)."""
+        return self._bpp
 
     @property
     def viewport(self) -> Measurable:
@@ -183,10 +267,14 @@ class Graphic(GObject.GObject, Measurable, metaclass=_GraphicMeta):
         """
         self._viewport = viewport
         self.tiles_pool = TilesPool(
-            self, viewport, self._scales, RENDER_SHAPE,
+            self, viewport, self._factors, RENDER_SHAPE,
             self._format, self.get_pixbuf
         )
         self.emit("ready", self.tiles_pool.is_ready)
+        # rasterize the initial rendering region before the first draw
+        self._preload_source = GLib.idle_add(
+            self._preload, priority=GLib.PRIORITY_LOW
+        )
 
     def on_updated(self) -> None:
         """Callback method for widget using this :class:`Graphic`.
@@ -195,11 +283,14 @@ class Graphic(GObject.GObject, Measurable, metaclass=_GraphicMeta):
         haved changed. If you need to override this method don't forget a call to
         super().on_updated().
         """
-        self.tiles_pool.__init__(
-            self, self.viewport, self._scales, RENDER_SHAPE,
-            self._format, self.get_pixbuf
-        )
-        self.emit("ready", self.tiles_pool.is_ready)
+        self._cancel_prefetch()
+        # reconfigured now, a pan coalesced on idle must not render
+        # in grids laid out for the previous viewport's properties.
+        if self.tiles_pool is not None:
+            self.tiles_pool.reconfigure(
+                self.viewport, self._factors, self._format
+            )
+            self.emit("ready", self.tiles_pool.is_ready)
 
     def on_removed(self) -> None:
         """Callback method for widget using this :class:`Graphic`.
@@ -208,6 +299,13 @@ class Graphic(GObject.GObject, Measurable, metaclass=_GraphicMeta):
         from a widget. If you need to override this method don't forget a call
         to super().on_removed().
         """
+        if self._prefetch_source is not None:
+            GLib.source_remove(self._prefetch_source)
+            self._prefetch_source = None
+        if self._preload_source is not None:
+            GLib.source_remove(self._preload_source)
+            self._preload_source = None
+        self._cancel_prefetch()
         self._viewport = None
         self.tiles_pool = None
 
@@ -228,6 +326,7 @@ class Graphic(GObject.GObject, Measurable, metaclass=_GraphicMeta):
         so the point(x, y) will fit inside. The (x, y) coordinates has to be express
         in the :attr:`Graphic.unit` of measure.
         """
+        self._cancel_prefetch()
         self.tiles_pool.set_rendering(x, y, self._scale_index)
 
     def get_render(self) -> Clip:
@@ -239,7 +338,10 @@ class Graphic(GObject.GObject, Measurable, metaclass=_GraphicMeta):
         Returns: a :class:`acide.tiles.Clip` of the rendering region that holds
                  a :class:`Gtk.Texture` and corresponding clipping informations.
         """
-        return self.tiles_pool.render()
+        self._cancel_prefetch()
+        clip = self.tiles_pool.render()
+        self._schedule_prefetch()
+        return clip
 
     def get_render_async(
         self,
@@ -247,8 +349,69 @@ class Graphic(GObject.GObject, Measurable, metaclass=_GraphicMeta):
         callback: AsyncReadyCallback,
         user_data: Any = None,
     ) -> None:
+        self._cancel_prefetch()
         gtask = Gio.Task.new(self, cancellable, callback, user_data)
         self.tiles_pool.render_async(None, callback, gtask)
+        self._schedule_prefetch()
+
+    def _schedule_prefetch(self) -> None:
+        if self._prefetch_source is None:
+            self._prefetch_source = GLib.idle_add(
+                self._prefetch, priority=GLib.PRIORITY_LOW
+            )
+
+    def _cancel_prefetch(self) -> None:
+        # prefetching jobs not yet started are dropped, so the single
+        # worker of the executor is free for the tiles on screen.
+        for future in self._prefetch_futures:
+            future.cancel()
+        self._prefetch_futures.clear()
+
+    def _prefetch(self) -> bool:
+        # render pixbufs of the tiles just outside the rendering
+        # region, so they will be ready when panning reach them.
+        self._prefetch_source = None
+        if self.tiles_pool is not None:
+            self._prefetch_tiles(self.tiles_pool.get_halo())
+        return GLib.SOURCE_REMOVE
+
+    def _preload(self) -> bool:
+        # render pixbufs of the tiles of the initial rendering region
+        self._preload_source = None
+        if self.tiles_pool is not None and self.tiles_pool.is_ready:
+            if not self.tiles_pool.has_rendering:
+                self.tiles_pool.set_rendering(0, 0, self._scale_index)
+            self._prefetch_tiles(self.tiles_pool.get_invalid_tiles())
+        return GLib.SOURCE_REMOVE
+
+    def _prefetch_tiles(self, tiles: List[Tile]) -> None:
+        scale = self._scale_int
+        for tile in tiles:
+            future = self.executor.submit(self.get_pixbuf, tile.rect, scale)
+            self._prefetch_futures.append(future)
+            future.add_done_callback(
+                functools.partial(self._on_prefetched, tile, scale)
+            )
+
+    def _on_prefetched(self, tile: Tile, scale: int, future: Future) -> None:
+        # called in a worker thread, tiles are only
+        # compressed from the main loop.
+        if not future.cancelled() and future.exception() is None:
+            GLib.idle_add(
+                self._compress_prefetched, tile, scale, future.result(),
+                priority=GLib.PRIORITY_LOW,
+            )
+
+    def _compress_prefetched(
+        self, tile: Tile, scale: int, pixbuf: Pixbuf
+    ) -> bool:
+        # the tile could have been rendered or the scale changed meanwhile
+        if (
+            self.tiles_pool is not None and scale == self._scale_int
+            and tile.z == 0
+        ):
+            tile.compress(pixbuf, self._format)
+        return GLib.SOURCE_REMOVE
 
     def get_render_finish(self, result: Gio.Task, data: any) -> Clip:
         return self.tiles_pool.render_finish(result)
@@ -268,6 +431,8 @@ class Graphic(GObject.GObject, Measurable, metaclass=_GraphicMeta):
         :attr:`Graphic.mem_format` property. When rendering the pixmap,
         subclass could consider using the :obj:`scale` argument and/or
         the :meth:`virtual_dpi` method to achieve expected result.
+        This method is called from the worker threads of :attr:`executor`
+        while the main loop could call it too.
 
         Returns:
             A :class:`acide.types.Pixbuf` holding the buffer with basic informations.
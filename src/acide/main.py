@@ -18,6 +18,8 @@
 
 import sys
 import asyncio
+import threading
+from pathlib import Path
 
 import gi
 gi.require_version('Gtk', '4.0')
@@ -26,15 +28,9 @@ gi.require_version('Adw', '1')
 
 from gi.repository import Adw, Gio, GLib, Gtk, Gdk
 
-import gbulb
-gbulb.install(gtk=True)
-
-import fitz
-
 from acide.ui.surface import GraphicViewport
 from acide.ui.window import AboutDialog, AcideWindow
 from acide import format_size
-from acide.doc import Document, Page
 
 #TODO: * Look at GtkUIManager
 #      * Logging
@@ -42,15 +38,51 @@ from acide.doc import Document, Page
 #      * typing function
 #
 
+# Size of the disk backed store of a document, rendered tiles evicted
+# from the in memory cache of its pages are kept there. The backing file
+# is created in the user cache directory, the temporary directory is
+# often a tmpfs where it would be resident memory.
+STORE_SIZE = 256 * 2**20
+
 class AcideApplication(Adw.Application):
     """The main application singleton class."""
 
     def __init__(self):
         super().__init__(application_id='io.github.gravures.acide',
                          flags=Gio.ApplicationFlags.FLAGS_NONE)
+        self.document = None
 
     def load_pdf(self, window):
-        window.set_document(Document("/home/gilles/PDF/colon_F4.pdf"))
+        # opening a document parses the pdf and interprets the content
+        # stream of its first page, this is done in a worker thread
+        # to not block the main loop.
+        threading.Thread(
+            target=self._load_pdf_worker,
+            args=(window, "/home/gilles/PDF/colon_F4.pdf"),
+            name="load_pdf",
+            daemon=True,
+        ).start()
+
+    def _load_pdf_worker(self, window, path):
+        # PyMuPDF is only loaded when a document is opened
+        from acide.doc import Document
+
+        store_path = Path(GLib.get_user_cache_dir()) / "acide"
+        store_path.mkdir(parents=True, exist_ok=True)
+        document = Document(
+            path, store_size=STORE_SIZE, store_path=store_path
+        )
+        GLib.idle_add(self._on_pdf_loaded, window, document)
+
+    def _on_pdf_loaded(self, window, document):
+        if self.document is not None:
+            window.set_document(None)
+            self.document.close()
+        self.document = document
+        # pages are built here, in the main thread
+        window.set_document(self.document)
+        self.document.preload_neighbours()
+        return GLib.SOURCE_REMOVE
 
     def do_startup(self):
         """This function is called when the application is first started.
@@ -82,10 +114,10 @@ class AcideApplication(Adw.Application):
         self._setup_menus(win)
         self._setup_theme(win)
 
-        self.load_pdf(win)
-
         win.set_default_size(1100, 700)
         win.present_with_time(Gdk.CURRENT_TIME)
+        # the document is loaded while the window is presented
+        self.load_pdf(win)
 
     def _setup_menus(self, window):
         builder = Gtk.Builder().new_from_resource(
@@ -117,8 +149,9 @@ class AcideApplication(Adw.Application):
         # self.config.win_height, self.config.win_width = self.window.get_size()
         # self.config.win_x, self.config.win_y = self.window.get_position()
         # self.config.save()
-        if self.document:
+        if self.document is not None:
             self.document.close()
+            self.document = None
 
         windows = self.get_windows()
         for window in windows:
@@ -152,6 +185,9 @@ class AcideApplication(Adw.Application):
 
 def main(version):
     """The application's entry point."""
+    import gbulb
+    gbulb.install(gtk=True)
+
     app = AcideApplication()
     loop = asyncio.get_event_loop()
     return loop.run_forever(application=app)
@@ -286,12 +286,10 @@ cdef class _CMeasurable():
 
     cdef Extents_s get_extents(self):
         cdef Extents_s extents
-        tl = self.get_top_left()
-        br = self.get_bottom_right()
-        extents.x0 = tl.x
-        extents.y0 = tl.y
-        extents.x1 = br.x
-        extents.y1 = br.y
+        extents.x0 = self.rect.get_x()
+        extents.y0 = self.rect.get_y()
+        extents.x1 = extents.x0 + self.rect.get_width()
+        extents.y1 = extents.y0 + self.rect.get_height()
         return extents
 
     cpdef object get_center(self):
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+# store.py
+#
+# Copyright 2022 Gilles Coissac
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Acide store module.
+
+A disk backed storage for rendered pixmap buffers.
+"""
+import mmap
+import tempfile
+import threading
+from collections import deque
+from pathlib import Path
+from typing import Deque, Dict, Hashable, Optional, Tuple
+
+from acide import format_size
+from acide.types import Pixbuf
+
+
+TILE_STORE_SIZE = 2**30
+
+
+class TileStore():
+    """A disk backed store of pixmap buffers.
+
+    Buffers are written in a memory mapped temporary file used as a ring
+    buffer: when the end of file is reached, writing restarts at
+    its beginning and entries overwritten are dropped. The kernel pages
+    in the mapped regions on demand, so a :class:`TileStore` could
+    hold a lot more pixmaps than an in memory cache for a large document.
+
+    :meth:`get` returns :class:`acide.types.Pixbuf` holding a copy of
+    the stored buffer, so a later :meth:`put` could safely overwrite
+    its region of the file.
+
+    Args:
+        size: an :class:`int` as the size in bytes of the store,
+              default to :obj:`TILE_STORE_SIZE`.
+        path: an optional directory where to create the backing file,
+              default to the system temporary directory.
+    """
+
+    def __init__(
+        self, size: int = TILE_STORE_SIZE, path: Optional[Path] = None
+    ) -> 'TileStore':
+        if size <= 0:
+            raise ValueError("size should be strictly positive")
+        self._size = size
+        self._file = tempfile.TemporaryFile(dir=path)
+        self._file.truncate(size)  # sparse file on most file systems
+        self._mmap = mmap.mmap(self._file.fileno(), size)
+        # key -> (offset, length, width, height)
+        self._index: Dict[Hashable, Tuple[int, int, int, int]] = {}
+        # (offset, length, key) in writing order, which is also the order
+        # of the regions in the file starting from the writing offset.
+        self._ring: Deque[Tuple[int, int, Hashable]] = deque()
+        self._offset = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._index
+
+    def get(self, key: Hashable) -> Optional[Pixbuf]:
+        """Returns a :class:`acide.types.Pixbuf` with a copy of the buffer
+        stored for :obj:`key` or None if there is none."""
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is None:
+                return None
+            offset, length, width, height = entry
+            # slicing a mmap returns a copy as bytes
+            return Pixbuf(self._mmap[offset:offset + length], width, height)
+
+    def put(self, key: Hashable, pixbuf: Pixbuf) -> bool:
+        """Store a copy of :obj:`pixbuf`'s buffer for :obj:`key`.
+
+        Returns:
+            False if the buffer is larger than the store, otherwise True.
+        """
+        length = len(pixbuf.buffer)
+        if length > self._size:
+            return False
+        with self._lock:
+            if key in self._index:
+                return True
+            ring = self._ring
+            index = self._index
+            if self._offset + length > self._size:
+                # entries of the previous round left at the end of file
+                # are dropped as well, the ring restart from offset 0.
+                while ring and ring[0][0] >= self._offset:
+                    del index[ring.popleft()[2]]
+                self._offset = 0
+            start = self._offset
+            end = start + length
+            # the oldest entries are the ones following the writing offset
+            while ring and ring[0][0] < end and ring[0][0] + ring[0][1] > start:
+                del index[ring.popleft()[2]]
+            self._mmap[start:end] = pixbuf.buffer
+            index[key] = (start, length, pixbuf.width, pixbuf.height)
+            ring.append((start, length, key))
+            self._offset = end
+        return True
+
+    def clear(self) -> None:
+        """Drop all entries of the store."""
+        with self._lock:
+            self._index.clear()
+            self._ring.clear()
+            self._offset = 0
+
+    def close(self) -> None:
+        """Release the mapped file, the store should not be used after."""
+        self.clear()
+        self._mmap.close()
+        self._file.close()
+
+    def __str__(self) -> str:
+        return (
+            f"TileStore({len(self._index)} items, "
+            f"{format_size(self._offset)} / {format_size(self._size)})"
+        )
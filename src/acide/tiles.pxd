@@ -23,6 +23,7 @@ from acide.types cimport cimax, Pixbuf
 from acide.asyncop cimport Scheduler
 from acide.measure cimport _CMeasurable, Extents_s
 from cpython cimport Py_INCREF, Py_XDECREF
+from cpython.bytes cimport PyBytes_FromStringAndSize, PyBytes_AS_STRING
 
 cdef extern from "Python.h":
     ctypedef struct PyObject
@@ -85,6 +86,7 @@ cdef class TilesGrid(TypedGrid):
 
     # C METHODS
     cpdef object invalidate(TilesGrid self)
+    cdef list invalid_tiles(TilesGrid self)
     cdef compute_extents(TilesGrid self)
     cdef bint contains_point(TilesGrid self, double x, double y)
     cdef bint contains_extents(
@@ -92,6 +94,13 @@ cdef class TilesGrid(TypedGrid):
     )
     cdef stats(TilesGrid self)
     cpdef get_tile_indices(TilesGrid self, double x, double y)
+    cdef bint tile_indices(
+        TilesGrid self, double x, double y, Py_ssize_t* i, Py_ssize_t* j
+    )
+    cdef bint tiles_range(
+        TilesGrid self, double x0, double y0, double x1, double y1,
+        Py_ssize_t* i0, Py_ssize_t* j0, Py_ssize_t* i1, Py_ssize_t* j1,
+    )
 
 
 cdef class Clip():
@@ -112,6 +121,7 @@ cdef class SuperTile(TilesGrid):
 cdef class RenderTile(SuperTile):
     # MEMBERS
     cdef Carray buffer
+    cdef bytes bytes_buffer
     cdef object glib_bytes
     cdef bint is_valid, switch
     cdef Clip _clip, _r_clip
@@ -140,6 +150,7 @@ cdef class RenderTile(SuperTile):
 cdef class TilesPool():
     # MEMBERS
     cdef list stack
+    cdef list scales
     cdef Scheduler scheduler
     cdef int depth
     cdef int current
@@ -151,8 +162,12 @@ cdef class TilesPool():
     cdef object pixbuf_cb
     cdef Clip null_clip
     cdef object render_task
+    cdef set render_gtasks
 
     # C METHODS
+    cdef bint grid_shape(
+        TilesPool self, unsigned int scale, int* width, int* height
+    )
     cdef int make_tiles_grid(TilesPool self, unsigned int scale)
     cdef object init_tiles_grid(
         TilesPool self, TilesGrid tg,  unsigned int scale
@@ -20,6 +20,8 @@
 """
 import asyncio
 import functools
+import logging
+from concurrent.futures import Executor
 from typing import (
     Any, Callable, Union, Optional, NoReturn, Sequence, Tuple,
     Coroutine, Awaitable
@@ -43,6 +45,8 @@ from acide.measure import Measurable, Unit
 
 BLOSC_MAX_BYTES_CHUNK = 2**31
 
+_LOG = logging.getLogger(__name__)
+
 Timer.set_logging(False)
 
 cdef object gdk_memory_format_mapping():
@@ -313,33 +317,86 @@ cdef class TilesGrid(TypedGrid):
         if self._z != 0:
             self._r = self._u / float(self._z)
 
-    def compress(self, pixbuf_cb: PixbufCallback, scale: int) -> None:
+    cdef list invalid_tiles(self):
+        """Returns a list of the :class:`Tile` in this Grid
+        without a valid internal buffer."""
+        cdef Py_ssize_t x, y
+        cdef list tiles = []
+        for x in range(self.view.shape[0]):
+            for y in range(self.view.shape[1]):
+                tile = self._ref.items[self.view[x, y]]
+                if isinstance(tile, Tile) and (<Tile> tile).buffer is None:
+                    tiles.append(tile)
+        return tiles
+
+    def compress(
+        self,
+        pixbuf_cb: PixbufCallback,
+        scale: int,
+        executor: Optional[Executor] = None,
+    ) -> None:
         """Compress all Tiles in this Grid that have not yet a valid internal buffer.
 
         Args:
             pixbuf_cb: a callback function to retrieve parts of a pixmap in
                         the form pixbuf_cb(rect: Graphene.Rect) -> BufferProtocol
             scale: an int as a scale factor passed to the pixbuf_cb function
+            executor: an optional :class:`concurrent.futures.Executor`, if set
+                      the pixbuf_cb calls will be run by it.
         """
-        for step in self._compress_gen(pixbuf_cb, scale):
-            continue
+        if executor is None:
+            for step in self._compress_gen(pixbuf_cb, scale):
+                continue
+            return
+        tiles = self.invalid_tiles()
+        pixbufs = executor.map(
+            pixbuf_cb, [(<Tile> tile).rect for tile in tiles],
+            [scale] * len(tiles),
+        )
+        for tile, pixbuf in zip(tiles, pixbufs):
+            (<Tile> tile).compress(pixbuf, self.memory_format)
+        self.stats()
 
     async def compress_async(
-        self, pixbuf_cb: PixbufCallback, scale: int
+        self,
+        pixbuf_cb: PixbufCallback,
+        scale: int,
+        executor: Optional[Executor] = None,
     ) -> Coroutine:
         """Compress asynchronously all Tiles in this Grid.
 
+        When an :obj:`executor` is given, the pixbuf_cb calls are run
+        in it and awaited, so the event loop is not blocked while
+        rendering, compression of the resulting pixbufs is then done
+        in the calling thread.
+
         Args:
             pixbuf_cb: a callback function to retrieve parts of a pixmap in
                         the form pixbuf_cb(rect: Graphene.Rect) -> BufferProtocol
             scale: an int as a scale factor passed to the pixbuf_cb function
+            executor: an optional :class:`concurrent.futures.Executor`
 
         Returns:
             a coroutine doing the compression.
         """
         # for step in self._compress_gen(pixbuf_cb, scale):
         #     await asyncio.sleep(0)
-        self._compress_gen(pixbuf_cb, scale)
+        if executor is None:
+            self._compress_gen(pixbuf_cb, scale)
+            return
+        loop = asyncio.get_running_loop()
+        tiles = self.invalid_tiles()
+        pixbufs = await asyncio.gather(
+            *[
+                loop.run_in_executor(
+                    executor, pixbuf_cb, (<Tile> tile).rect, scale
+                )
+                for tile in tiles
+            ]
+        )
+        for tile, pixbuf in zip(tiles, pixbufs):
+            (<Tile> tile).compress(pixbuf, self.memory_format)
+        self.stats()
 
     async def _compress_tile_co(self, tile, pixbuf_cb, int scale):
         cdef Tile _tile = <Tile> tile
@@ -409,22 +466,78 @@ cdef class TilesGrid(TypedGrid):
             indices as an int tuple(x, y) where to find the Tile or None
             if this :class:`TilesGrid` is empty.
         """
-        if self.view is not None:
-            x = self.extents.x0 if x < self.extents.x0 else x
-            y = self.extents.y0 if y < self.extents.y0 else y
-            return (
-                <Py_ssize_t> cmin(
-                    self.view.shape[0],
-                    self.view.shape[0] * (x / self.extents.x1)
-                ),
-                <Py_ssize_t> cmin(
-                    self.view.shape[1],
-                    self.view.shape[1] * (y / self.extents.y1)
-                )
-            )
+        cdef Py_ssize_t i, j
+        if self.tile_indices(x, y, &i, &j):
+            return (i, j)
         else:
             return None
 
+    @cython.cdivision(True)
+    cdef bint tile_indices(
+        self, double x, double y, Py_ssize_t* i, Py_ssize_t* j
+    ):
+        """C version of :meth:`get_tile_indices` storing the result in
+        :obj:`i` and :obj:`j`, returns False if this grid is empty."""
+        if self.view is None or self.extents.x1 <= 0 or self.extents.y1 <= 0:
+            return False
+        x = self.extents.x0 if x < self.extents.x0 else x
+        y = self.extents.y0 if y < self.extents.y0 else y
+        i[0] = <Py_ssize_t> cmin(
+            self.view.shape[0], self.view.shape[0] * (x / self.extents.x1)
+        )
+        j[0] = <Py_ssize_t> cmin(
+            self.view.shape[1], self.view.shape[1] * (y / self.extents.y1)
+        )
+        return True
+
+    def get_tiles_range(self, double x0, double y0, double x1, double y1):
+        """Returns the range of indices for the :class:`Tile` intersecting
+        the region (x0, y0, x1, y1).
+
+        Tiles of a :class:`TilesGrid` are equally sized, so the range
+        is computed from the grid extents without testing each :class:`Tile`.
+
+        Args:
+            x0, y0, x1, y1: extents of the region express in unit of measure
+                            for the :class:`Measurable` this :class:`TilesGrid`
+                            belong to.
+
+        Returns:
+            a four int tuple (i0, j0, i1, j1) where i1 and j1 are excluded
+            or None if the region doesn't intersect this :class:`TilesGrid`.
+        """
+        cdef Py_ssize_t i0, j0, i1, j1
+        if self.tiles_range(x0, y0, x1, y1, &i0, &j0, &i1, &j1):
+            return (i0, j0, i1, j1)
+        return None
+
+    @cython.cdivision(True)
+    cdef bint tiles_range(
+        self, double x0, double y0, double x1, double y1,
+        Py_ssize_t* i0, Py_ssize_t* j0, Py_ssize_t* i1, Py_ssize_t* j1,
+    ):
+        """C version of :meth:`get_tiles_range` storing the result in
+        :obj:`i0`, :obj:`j0`, :obj:`i1` and :obj:`j1`, returns False
+        if the region doesn't intersect this grid."""
+        cdef double tw, th
+        cdef Py_ssize_t w, h
+        if self.view is None:
+            return False
+        if (
+            x1 <= self.extents.x0 or x0 >= self.extents.x1 or
+            y1 <= self.extents.y0 or y0 >= self.extents.y1
+        ):
+            return False
+        w = self.view.shape[0]
+        h = self.view.shape[1]
+        tw = (self.extents.x1 - self.extents.x0) / w
+        th = (self.extents.y1 - self.extents.y0) / h
+        i0[0] = cimax(<int> ((cmax(x0, self.extents.x0) - self.extents.x0) / tw), 0)
+        j0[0] = cimax(<int> ((cmax(y0, self.extents.y0) - self.extents.y0) / th), 0)
+        i1[0] = cimin(ciceil((cmin(x1, self.extents.x1) - self.extents.x0) / tw), w)
+        j1[0] = cimin(ciceil((cmin(y1, self.extents.y1) - self.extents.y0) / th), h)
+        return True
+
     cdef stats(self):
         cdef Py_ssize_t x, y
         self._u = self._z = 0
@@ -564,6 +677,7 @@ cdef class RenderTile(SuperTile):
     def __cinit__(self, grid, shape=(2, 2), *args, **kwargs):
         self.is_valid = False
         self.buffer = None
+        self.bytes_buffer = None
         self.glib_bytes = None
         self._clip = Clip.__new__(Clip)
         self._r_clip = Clip.__new__(Clip)
@@ -627,15 +741,21 @@ cdef class RenderTile(SuperTile):
         self._r = self._u / float(self._z)
 
         try:
+            # the buffer memory is owned by a bytes object, so it could be
+            # handed to GLib.Bytes without an intermediate copy
+            itemsize = (<Tile> self[0, 0]).u_itemsize
+            self.bytes_buffer = PyBytes_FromStringAndSize(NULL, sh * itemsize)
             self.buffer = Carray.__new__(
                 Carray,
                 shape=(sh,),
-                itemsize=(<Tile> self[0, 0]).u_itemsize,
+                itemsize=itemsize,
                 format=(<Tile> self[0, 0]).u_format,
                 mode='c',
-                allocate_buffer=True,
+                allocate_buffer=False,
             )
+            self.buffer.data = PyBytes_AS_STRING(self.bytes_buffer)
         except MemoryError as m:
+            self.bytes_buffer = None
             self.msg = (
                 f"{m}: "
                 f"shape({sh},), "
@@ -774,15 +894,10 @@ cdef class RenderTile(SuperTile):
                 raise MemoryError(f"{self.msg}")
 
             if self.fill_buffer() > 0:
-                _T = Timer("PyBytes_FromObject")
-                _bytes = PyBytes_FromObject(self.buffer)
-                _T.stop()
                 _T = Timer("glib.bytes")
-                #FIXME: here data is copied 2 times !!!
-                self.glib_bytes = GLib.Bytes.new_take(
-                    _bytes
-                )
+                self.glib_bytes = GLib.Bytes.new(self.bytes_buffer)
                 self.buffer = None
+                self.bytes_buffer = None
                 _T.stop()
                 _T = Timer("Gdk.Texture")
                 self._clip._texture = Gdk.MemoryTexture.new(
@@ -790,7 +905,7 @@ cdef class RenderTile(SuperTile):
                     self._clip._h,
                     self.memory_format,
                     self.glib_bytes,
-                    3 * self._clip._w,
+                    gdk_memory_format_sizes[self.memory_format] * self._clip._w,
                 )
                 _T.stop()
                 self.is_valid = True
@@ -809,15 +924,10 @@ cdef class RenderTile(SuperTile):
 
             if self.fill_buffer() > 0:
                 # await asyncio.sleep(0)
-                _T = Timer("PyBytes_FromObject")
-                _bytes = PyBytes_FromObject(self.buffer)
-                _T.stop()
                 _T = Timer("glib.bytes")
-                #FIXME: here data is copied 2 times !!!
-                glib_bytes = GLib.Bytes.new_take(
-                    _bytes
-                )
+                glib_bytes = GLib.Bytes.new(self.bytes_buffer)
                 self.buffer = None
+                self.bytes_buffer = None
                 _T.stop()
                 # await asyncio.sleep(0)
                 clip._texture = Gdk.MemoryTexture.new(
@@ -825,7 +935,7 @@ cdef class RenderTile(SuperTile):
                     clip._h,
                     self.memory_format,
                     glib_bytes,
-                    3 * clip._w,
+                    gdk_memory_format_sizes[self.memory_format] * clip._w,
                 )
                 self.is_valid = True
             else:
@@ -898,6 +1008,8 @@ cdef class TilesPool():
         self.scheduler = Scheduler.new()
         self.scheduler.run(Run.FOREVER)
         self.null_clip = Clip()
+        # Gio.Task of render_async requests not yet returned
+        self.render_gtasks = set()
         self.current = -1
 
     def __init__(
@@ -913,6 +1025,7 @@ cdef class TilesPool():
         self.current = -1
         self.stack = []
         self.validate_scales(scales)
+        self.scales = list(scales)
 
         for scl in scales:
             if self.make_tiles_grid(scale=int(scl)) > 0:
@@ -948,9 +1061,11 @@ cdef class TilesPool():
             )
         scales.sort()
 
-    cdef int make_tiles_grid(self, unsigned int scale):
+    cdef bint grid_shape(
+        self, unsigned int scale, int* width, int* height
+    ):
         cdef double vw, vh, gw, gh, trs
-        cdef int width, height, rw, rh
+        cdef int rw, rh
         vw, vh = self.viewport.size
         rw, rh = self.render_shape
         trs = self.viewport.get_transform(self.graphic.unit)
@@ -958,8 +1073,14 @@ cdef class TilesPool():
             gw, gh = self.graphic.size
             gw *= scale
             gh *= scale
-            width = cimax(rw, ciceil(gw / (vw * trs)))
-            height = cimax(rh, ciceil(gh / (vh * trs)))
+            width[0] = cimax(rw, ciceil(gw / (vw * trs)))
+            height[0] = cimax(rh, ciceil(gh / (vh * trs)))
+            return True
+        return False
+
+    cdef int make_tiles_grid(self, unsigned int scale):
+        cdef int width, height
+        if self.grid_shape(scale, &width, &height):
             self.stack.append(
                 TilesGrid(
                     shape=(width, height),
@@ -969,6 +1090,69 @@ cdef class TilesPool():
             return 1
         return 0
 
+    def reconfigure(
+        self,
+        viewport: Measurable,
+        scales: Sequence[int],
+        mem_format: Gdk.MemoryFormat,
+    ) -> None:
+        """Reconfigure this :class:`TilesPool` after a change of the
+        viewport's properties.
+
+        Unlike a new call to :meth:`__init__`, :class:`TilesGrid` keeping
+        the same shape and resolution are reused with their compressed
+        :class:`Tile`, only the others are rebuilt. A change of
+        :obj:`scales` or :obj:`mem_format` rebuild the whole pool.
+
+        Args:
+            viewport: the rendering widget, should implement
+                      :class:`acide.measure.Measurable`
+            scales: A sequences of positive int as the available scale factors
+            mem_format: a enum's member of :class:`Gdk.MemoryFormat`
+        """
+        cdef int width, height
+        cdef unsigned int scl
+        cdef TilesGrid tg
+        cdef list stack
+
+        scales = list(scales)
+        self.validate_scales(scales)
+        self.viewport = viewport
+        if (
+            mem_format != self.memory_format
+            or scales != self.scales
+            or len(self.stack) != len(scales)
+        ):
+            self.memory_format = mem_format
+            self.__init__(
+                self.graphic, viewport, scales, self.render_shape,
+                mem_format, self.pixbuf_cb
+            )
+            return
+
+        _T = Timer("TilesPool reconfigure")
+        stack = []
+        for i, _scl in enumerate(scales):
+            scl = int(_scl)
+            if not self.grid_shape(scl, &width, &height):
+                stack = []
+                break
+            tg = <TilesGrid> self.stack[i]
+            if (
+                tg.view.shape[0] != width
+                or tg.view.shape[1] != height
+                or (<Tile> tg.getitem_at(0, 0)).dpi != self.graphic.dpi * scl
+            ):
+                tg = TilesGrid(shape=(width, height), format=mem_format)
+                self.init_tiles_grid(tg, scl)
+            stack.append(tg)
+        self.stack = stack
+        self.depth = len(self.stack)
+        # force set_rendering() to rebuild the render_tile
+        # from the reconfigured TilesGrid
+        self.current = -1
+        _T.stop()
+
     cdef init_tiles_grid(self, TilesGrid tg, unsigned int scale):
         cdef int sw, sh, x, y
         cdef double w, h, wt, ht
@@ -988,7 +1172,7 @@ cdef class TilesPool():
     cdef schedule_compression(self):
         cdef int i = 0
         cdef int _next = 0
-        cdef int scale = int(self.graphic.scale)
+        cdef int scale = self.graphic.scale_int
 
         tg = self.stack[self.current]
 
@@ -1007,7 +1191,7 @@ cdef class TilesPool():
             i = 0
             _next = self.current + 1
             tg = self.stack[_next]
-            scale = int(self.graphic._scales[self.graphic._scale_index + 1])
+            scale = self.graphic._scale_ints[self.graphic._scale_index + 1]
             gen = tg.compress_async_generator(self.pixbuf_cb, scale)
             for _co in gen:
                 self.scheduler.add(
@@ -1031,9 +1215,9 @@ cdef class TilesPool():
             depth: a positive integer as an index of scales given at
                    :class:`TilesPool` initialzation
         """
-        cdef int i, j, cx, cy
+        cdef Py_ssize_t i, j
+        cdef int cx, cy, w, h
         _T = Timer("set_rendering")
-        i, j = self.stack[self.current].get_tile_indices(x, y)
 
         if depth != self.current:
             # FIXME: should we invalidate TilesGrid? or
@@ -1046,8 +1230,18 @@ cdef class TilesPool():
             )
             self.schedule_compression()
 
-        cx, cy = self.render_tile.get_center()
-        self.render_tile.move_to(i - cx, j - cy)
+        # indices should be looked for in the grid of the current depth
+        if not (<TilesGrid> self.stack[self.current]).tile_indices(
+            x, y, &i, &j
+        ):
+            _T.stop()
+            return
+        # inlined TypedGrid.get_center()
+        w = self.render_tile.view.shape[0]
+        h = self.render_tile.view.shape[1]
+        cx = (w // 2) - ((w + 1) % 2)
+        cy = (h // 2) - ((h + 1) % 2)
+        self.render_tile.move_to(<int> i - cx, <int> j - cy)
         _T.stop()
 
     cpdef render(self):
@@ -1057,12 +1251,68 @@ cdef class TilesPool():
             a :class:`Clip` holding a :class:`Gdk.Tetxure`
         """
         if self.render_tile is not None:
-            (<TilesGrid> self.stack[self.current]).compress(self.pixbuf_cb)
+            # only the tiles under the render tile are needed,
+            # not the whole grid of the current scale. The caller waits
+            # for them, they are rendered inline rather than queued
+            # behind the jobs of the single worker of the executor.
+            self.render_tile.compress(self.pixbuf_cb, self.graphic.scale_int)
             self.render_tile.render_texture()
             return self.render_tile._clip
         else:
             return self.null_clip
 
+    @property
+    def has_rendering(self) -> bool:
+        """True if :meth:`set_rendering` has setup a :class:`RenderTile`
+        (read only)."""
+        return self.render_tile is not None and self.current != -1
+
+    def get_invalid_tiles(self) -> list:
+        """Returns the :class:`Tile` of the :class:`RenderTile` without
+        a valid compressed buffer.
+
+        Returns:
+            a list of :class:`Tile`, empty if rendering was not setup.
+        """
+        if self.render_tile is None or self.current == -1:
+            return []
+        return self.render_tile.invalid_tiles()
+
+    def get_halo(self, int size=1) -> list:
+        """Returns the :class:`Tile` surrounding the :class:`RenderTile`.
+
+        Only :class:`Tile` without a valid compressed buffer are returned,
+        this is intended to prefetch tiles before panning reach them.
+
+        Args:
+            size: the width in tiles of the ring around the render tile.
+
+        Returns:
+            a list of :class:`Tile`.
+        """
+        cdef TilesGrid tg
+        cdef Py_ssize_t i0, j0, i1, j1, x, y, w, h
+        cdef Extents_s ext
+        cdef list tiles = []
+        if self.render_tile is None:
+            return tiles
+        tg = <TilesGrid> self.stack[self.current]
+        ext = self.render_tile.extents
+        if not tg.tiles_range(
+            ext.x0, ext.y0, ext.x1, ext.y1, &i0, &j0, &i1, &j1
+        ):
+            return tiles
+        w = tg.view.shape[0]
+        h = tg.view.shape[1]
+        for x in range(cimax(i0 - size, 0), cimin(i1 + size, w)):
+            for y in range(cimax(j0 - size, 0), cimin(j1 + size, h)):
+                if i0 <= x < i1 and j0 <= y < j1:
+                    continue
+                tile = tg.getitem_at(x, y)
+                if tile is not None and (<Tile> tile).buffer is None:
+                    tiles.append(tile)
+        return tiles
+
     def render_async(
         self,
         cancellable: Gio.Cancellable,
@@ -1089,32 +1339,75 @@ cdef class TilesPool():
         else:
             gtask = Gio.Task.new(self, cancellable, callback, user_data)
         self.scheduler.stop()
+        self.render_gtasks.add(gtask)
+        co = self._render_super_tile_co(gtask)
         self.render_task = self.scheduler.add(
-            self._render_super_tile_co(gtask),
+            co,
             Priority.HIGH,
             callback=None,
             name="render_tile",
         )
+        self.render_task.add_done_callback(
+            functools.partial(self._on_render_task_done, gtask, co)
+        )
         self.scheduler.run(Run.LAST)
 
     async def _render_super_tile_co(self,  gtask: Gio.AsyncResult):
         try:
             _T = Timer("_render_super_tile_co")
             await self.render_tile.compress_async(
-                self.pixbuf_cb, self.graphic.scale
+                self.pixbuf_cb, self.graphic.scale_int, self.graphic.executor
             )
+            # don't upload a texture for a superseded request
+            if self._return_if_cancelled(gtask):
+                return
             await self.render_tile.render_texture_async()
             _T.stop()
         except asyncio.CancelledError:
-            print("render cancelled")
+            _LOG.debug("render cancelled")
+            # superseded by a newer request, the gtask is completed
+            # with an error even if the caller didn't cancel it.
+            self._return_cancelled(gtask)
             raise
         else:
-            self._on_render_ready_cb(gtask)
+            if not self._return_if_cancelled(gtask):
+                self._on_render_ready_cb(gtask)
         finally:
             pass
 
+    def _on_render_task_done(
+        self, gtask: Gio.Task, co: Coroutine, task: asyncio.Task
+    ) -> None:
+        # a request superseded before its coroutine started is
+        # completed here, there was no CancelledError to catch.
+        if task.cancelled():
+            co.close()
+            self._return_cancelled(gtask)
+
+    def _return_if_cancelled(self, gtask: Gio.Task) -> bool:
+        # complete the gtask with an error if cancelled by the caller
+        if gtask.return_error_if_cancelled():
+            self.render_gtasks.discard(gtask)
+            return True
+        return False
+
+    def _return_cancelled(self, gtask: Gio.Task) -> None:
+        # complete the gtask with an error, unless already returned
+        if gtask not in self.render_gtasks:
+            return
+        if not self._return_if_cancelled(gtask):
+            self.render_gtasks.discard(gtask)
+            gtask.return_error(
+                GLib.Error.new_literal(
+                    Gio.io_error_quark(),
+                    "render superseded by a newer request",
+                    Gio.IOErrorEnum.CANCELLED,
+                )
+            )
+
     def _on_render_ready_cb(self, gtask: Gio.AsyncResult) -> None:
         # complete the gtask calling the render_async callback
+        self.render_gtasks.discard(gtask)
         gtask.return_boolean(True)
         # self.dump_stack()
 
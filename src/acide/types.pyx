@@ -89,7 +89,9 @@ cdef class Timer():
 
     def __cinit__(self, name: str = "unknown"):
         self.name = name
-        self.start = time.clock_gettime_ns(time.CLOCK_PROCESS_CPUTIME_ID)
+        # timers stay in hot paths, the clock is only read when logging
+        if _get_log_timer():
+            self.start = time.clock_gettime_ns(time.CLOCK_PROCESS_CPUTIME_ID)
 
     @staticmethod
     def set_logging(bint val) -> None:
@@ -103,15 +105,16 @@ cdef class Timer():
         Stop and log the result on sys.stdout if global logging was
         set with :meth:`set_logging`.
         """
+        if not _get_log_timer():
+            return
         self.time = (
             time.clock_gettime_ns(time.CLOCK_PROCESS_CPUTIME_ID) -\
             self.start
         )
-        if _get_log_timer():
-            print(
-                f"BENCHMARK({self.name}): {self.time} μs "
-                f"| {self.time / 1000000000:.3f} sec\n"
-            )
+        print(
+            f"BENCHMARK({self.name}): {self.time} μs "
+            f"| {self.time / 1000000000:.3f} sec\n"
+        )
 
 
 cdef class TypedGrid():
@@ -39,6 +39,10 @@ So on a HiDPI display the logical and physical measurements may differ in scale,
 typically by a factor of 2. In most places we're dealing with logical units methods,
 but take care that some methods like Texture.get_width() returns physical units.
 """
+import math
+import sys
+from collections import OrderedDict
+from operator import attrgetter
 from typing import Any, Union, Optional, Tuple
 
 import gi
@@ -47,13 +51,20 @@ gi.require_version("Gdk", "4.0")
 gi.require_version('Gsk', '4.0')
 gi.require_version('Graphene', '1.0')
 
-from gi.repository import Gdk, GdkPixbuf, Gio, GObject, Graphene, Gsk, Gtk, Pango
+from gi.repository import Gdk, Gio, GLib, GObject, Graphene, Gsk, Gtk
 import cairo
 
 from acide.measure import Measurable, GObjectMeasurableMeta, Unit
 from acide.graphic import Graphic
 
 
+# cairo.FORMAT_ARGB32 is premultiplied and in native endianness
+if sys.byteorder == "little":
+    _CAIRO_ARGB32_FORMAT = Gdk.MemoryFormat.B8G8R8A8_PREMULTIPLIED
+else:
+    _CAIRO_ARGB32_FORMAT = Gdk.MemoryFormat.A8R8G8B8_PREMULTIPLIED
+
+
 class GraphicViewport(
     Gtk.Widget, Gtk.Scrollable, Measurable, metaclass=GObjectMeasurableMeta
 ):
@@ -121,82 +132,116 @@ class GraphicViewport(
         )
     }
 
+    _GETTERS = {
+        "workspace-margins": attrgetter("workspace_margins"),
+        "show-rulers": attrgetter("show_rulers"),
+        "rulers-unit": attrgetter("rulers_unit"),
+        "graphic": attrgetter("graphic"),
+        "hscroll-policy": attrgetter("_hscroll_policy"),
+        "vscroll-policy": attrgetter("_vscroll_policy"),
+        "hadjustment": attrgetter("hadjustment"),
+        "vadjustment": attrgetter("vadjustment"),
+    }
+
     def do_get_property(self, prop):
-        if prop.name == "workspace-margins":
-            return self.workspace_margins
-        elif prop.name == "show-rulers":
-            return self.show_rulers
-        elif prop.name == "rulers-unit":
-            return self.rulers_unit
-        elif prop.name == "graphic":
-            return self.graphic
-        elif prop.name == "hscroll-policy":
-            return self._hscroll_policy
-        elif prop.name == "vscroll-policy":
-            return self._vscroll_policy
-        elif prop.name == "hadjustment":
-            return self.hadjustment
-        elif prop.name == "vadjustment":
-            return self.vadjustment
-        else:
-            raise AttributeError(f'unknown property {prop.name}')
+        try:
+            return self._GETTERS[prop.name](self)
+        except KeyError:
+            raise AttributeError(f'unknown property {prop.name}') from None
+
+    def _set_workspace_margins(self, value):
+        if not isinstance(value, Gtk.Border):
+            raise TypeError(
+                "workspace-margins should be a Gtk.Border "
+                f"not {value.__class__.__name__}"
+            )
+        # TODO: minimum margin to rulers size
+        self.workspace_margins = value
+        self.update_workspace_size()
+        self.queue_draw()
 
-    def do_set_property(self, prop, value):
-        if prop.name == "workspace-margins":
-            if not isinstance(value, Gtk.Border):
-                raise TypeError(
-                    f"workspace-margins should be a Gtk.Border not {value.__class}"
-                )
-            # TODO: minimum margin to rulers size
-            self.workspace_margins = value
+    def _set_show_rulers(self, value):
+        self.show_rulers = bool(value)
+        self.queue_draw()
+
+    def _set_rulers_unit(self, value):
+        if not isinstance(value, Unit):
+            raise TypeError(
+                "rulers-unit should be a Unit enum member "
+                f"not {value.__class__.__name__}"
+            )
+        self.rulers_unit = value
+        self.queue_draw()
+
+    def _set_graphic(self, value):
+        if isinstance(value, Graphic):
+            self._cancel_render()
+            if self.graphic is not None:
+                self.graphic.on_removed()
+            self.graphic = value
+            self.graphic.on_added(self)
+            self.update_metrics()
             self.update_workspace_size()
+            self.graphic.connect("ready", self._on_graphic_ready_cb)
+            self.graphic.connect("scaled", self._on_graphic_scaled_cb)
+        elif value is None:
+            self._cancel_render()
+            if self.graphic is not None:
+                self.graphic.on_removed()
+            self.graphic = None
+            self.render = None
             self.queue_draw()
-        elif prop.name == "show-rulers":
-            self.show_rulers = bool(value)
-            self.queue_draw()
-        elif prop.name == "rulers-unit":
-            if not isinstance(value, Unit):
-                raise TypeError(
-                    f"rulers-unit should be a Unit enum member not {value.__class}"
-                )
-            self.rulers_unit = value
-            self.queue_draw()
-        elif prop.name == "graphic":
-            if isinstance(value, Graphic):
-                if self.graphic is not None:
-                    self.graphic.on_removed()
-                self.graphic = value
-                self.graphic.on_added(self)
-                self.update_metrics()
-                self.update_workspace_size()
-                self.graphic.connect("ready", self._on_graphic_ready_cb)
-                self.graphic.connect("scaled", self._on_graphic_scaled_cb)
-            elif value is None:
-                if self.graphic is not None:
-                    self.graphic.on_removed()
-                self.graphic = None
-                self.queue_draw()
-            else:
-                raise TypeError(
-                    "graphic should implement the acide.graphic.Graphic interface"
-                )
-        elif prop.name == "hscroll-policy":
-            self._hscroll_policy = value
-        elif prop.name == "vscroll-policy":
-            self._vscroll_policy = value
-        elif prop.name == "hadjustment":
-            self.hadjustment = value
-            self._update_hadjustement()
-            self.hadjustment.connect("value-changed", self._on_view_changed)
-        elif prop.name == "vadjustment":
-            self.vadjustment = value
-            self._update_vadjustement()
-            self.vadjustment.connect("value-changed", self._on_view_changed)
         else:
-            raise AttributeError(f'unknown property {prop.name}')
+            raise TypeError(
+                "graphic should implement the acide.graphic.Graphic interface"
+            )
+
+    def _set_hscroll_policy(self, value):
+        self._hscroll_policy = value
+
+    def _set_vscroll_policy(self, value):
+        self._vscroll_policy = value
+
+    def _set_hadjustment(self, value):
+        self.hadjustment = value
+        self._last_hvalue = math.nan
+        self._update_hadjustement()
+        self.hadjustment.connect("value-changed", self._on_view_changed)
+
+    def _set_vadjustment(self, value):
+        self.vadjustment = value
+        self._last_vvalue = math.nan
+        self._update_vadjustement()
+        self.vadjustment.connect("value-changed", self._on_view_changed)
+
+    _SETTERS = {
+        "workspace-margins": _set_workspace_margins,
+        "show-rulers": _set_show_rulers,
+        "rulers-unit": _set_rulers_unit,
+        "graphic": _set_graphic,
+        "hscroll-policy": _set_hscroll_policy,
+        "vscroll-policy": _set_vscroll_policy,
+        "hadjustment": _set_hadjustment,
+        "vadjustment": _set_vadjustment,
+    }
+
+    def do_set_property(self, prop, value):
+        try:
+            setter = self._SETTERS[prop.name]
+        except KeyError:
+            raise AttributeError(f'unknown property {prop.name}') from None
+        setter(self, value)
+
+    # Pango.FontDescription of draw_text, created on first use
+    _text_font = None
 
     __slots__ = (
         "pixel_scale",
+        "_inv_pixel_scale",
+        "_rulers_px",
+        "_graphic2lpx_base",
+        "_pan_x_offset",
+        "_pan_y_offset",
         "device_margins",
         "workspace_size",
         "graphic_clip",
@@ -205,7 +250,37 @@ class GraphicViewport(
         "lpx2viewport_transform",
         "lpx2graphic_transform",
         "device_matrix",
+        "_grid_matrix",
+        "_grid_key",
+        "_grid_node",
         "render",
+        "render_scale",
+        "_rulers_key",
+        "_rulers_nodes",
+        "_bg_color",
+        "_gr_color",
+        "_pg_color",
+        "_black",
+        "_white",
+        "_fgbox",
+        "_clip_rect",
+        "_ruler_h_rect",
+        "_ruler_v_rect",
+        "_bg_node",
+        "_rulers_bg_node",
+        "_ticks_h_rect",
+        "_ticks_v_rect",
+        "_point",
+        "_text_layout",
+        "_label_face",
+        "_label_cache",
+        "_label_rect",
+        "_view_changed_source",
+        "_render_cancellable",
+        "_hadj_cfg",
+        "_last_hvalue",
+        "_last_vvalue",
+        "_vadj_cfg",
     )
 
     def __init__(self):
@@ -213,12 +288,50 @@ class GraphicViewport(
         Measurable.__init__(self)  # Mandatory
 
         self.pixel_scale: int = 1
+        self._inv_pixel_scale: float = 1.0
+        self._rulers_px: Tuple[int, int] = (0, 0)
+        self._graphic2lpx_base: float = 1.0
+        self._pan_x_offset: float = 0.0
+        self._pan_y_offset: float = 0.0
         self.workspace_size: Graphene.Size = Graphene.Size()  # in logical pixel
         self.rulers_size: Gtk.Border = Gtk.Border()  # in logical pixel
         self.rulers_size.left = self.rulers_size.top = 20
         self.device_matrix: cairo.Matrix = cairo.Matrix()
+        self._grid_matrix = cairo.Matrix(0.5, 0, 0, 0.5, 0, 0)
+        self._grid_key = None
+        self._grid_node = None
         self.graphic_clip: Graphene.Rect = Graphene.Rect()
         self.render = None
+        self.render_scale = 1
+        self._rulers_key = None
+        self._rulers_nodes = None
+        # TODO: get colors from css or preferences
+        self._bg_color = self.get_rgba(.4, .4, .4)
+        self._gr_color = self.get_rgba(1, 1, .8)
+        self._pg_color = self.get_rgba(1, 1, 1)
+        self._black = self.get_rgba(0, 0, 0)
+        self._white = self.get_rgba(1, 1, 1)
+        # scratch objects for snapshots
+        self._fgbox = Graphene.Rect()
+        self._clip_rect = Graphene.Rect()
+        self._ruler_h_rect = Graphene.Rect()
+        self._ruler_v_rect = Graphene.Rect()
+        self._ticks_h_rect = Graphene.Rect()
+        self._ticks_v_rect = Graphene.Rect()
+        self._bg_node = None
+        self._rulers_bg_node = None
+        self._update_snapshot_rects(0, 0)
+        self._point = Graphene.Point()
+        self._text_layout = None
+        self._label_face = cairo.ToyFontFace("sans")
+        self._label_cache: OrderedDict = OrderedDict()
+        self._label_rect = Graphene.Rect()
+        self._view_changed_source = None
+        self._render_cancellable = None
+        self._hadj_cfg = None
+        self._last_hvalue = math.nan
+        self._last_vvalue = math.nan
+        self._vadj_cfg = None
 
         # Inherited Gtk.Widget properties
         self.set_vexpand(True)
@@ -279,7 +392,7 @@ class GraphicViewport(
         # signals
         monitor.connect("notify::scale-factor", self.update_monitor_infos)
         # Proprties that should consequently be updates
-        if self.props.graphic is not None:
+        if self.graphic is not None:
             self.graphic.on_updated()
         # Transformation Matrix
         self.update_metrics()
@@ -293,19 +406,30 @@ class GraphicViewport(
         :attr:`size` for this viewport changed or when a :class:`Graphic` is added.
         It is safe to called update_metrics() at any time when needed.
         """
-        self.viewport2lpx_transform = self.get_transform(Unit.PIXEL) / self.pixel_scale
+        self._inv_pixel_scale = 1.0 / self.pixel_scale
+        # rulers thickness in physical pixel
+        self._rulers_px = (
+            self.rulers_size.top * self.pixel_scale,
+            self.rulers_size.left * self.pixel_scale,
+        )
+        self.viewport2lpx_transform = \
+            self.get_transform(Unit.PIXEL) * self._inv_pixel_scale
         self.lpx2viewport_transform = 1.0 / self.viewport2lpx_transform
-        self.device_matrix.xx = self.device_matrix.yy = 1 / self.pixel_scale
-        if self.props.graphic is not None:
-            self._update_graphic_transform(self.props.graphic)
+        self.device_matrix.xx = self.device_matrix.yy = self._inv_pixel_scale
+        graphic = self.graphic
+        if graphic is not None:
+            # only the scale factor changes between two metrics updates
+            self._graphic2lpx_base = (
+                graphic.get_transform(Unit.PIXEL) * (self.dpi / graphic.dpi)
+                * self._inv_pixel_scale
+            )
+            self._update_graphic_transform(graphic, graphic.scale)
         else:
+            self._graphic2lpx_base = 1.0
             self.graphic2lpx_transform = self.lpx2graphic_transform = 1.0
 
     def _update_graphic_transform(self, graphic, scale=1):
-        self.graphic2lpx_transform = (
-                (graphic.get_transform(Unit.PIXEL) * (self.dpi / graphic.dpi)) \
-                / self.pixel_scale * scale
-            )
+        self.graphic2lpx_transform = self._graphic2lpx_base * scale
         self.lpx2graphic_transform = 1.0 / self.graphic2lpx_transform
 
     def update_workspace_size(self) -> None:
@@ -315,19 +439,21 @@ class GraphicViewport(
         and workspace margins settings measured in logical pixel unit.
         """
         w = h = 0
-        if self.props.graphic is not None:
-            w = self.props.graphic.size[0] * self.graphic2lpx_transform
-            h = self.props.graphic.size[1] * self.graphic2lpx_transform
-            trs = self.viewport2lpx_transform * self.props.graphic.scale
-            self.device_margins.top = self.props.workspace_margins.top * trs
-            self.device_margins.bottom = self.props.workspace_margins.top * trs
-            self.device_margins.left = self.props.workspace_margins.top * trs
-            self.device_margins.right = self.props.workspace_margins.top * trs
+        graphic = self.graphic
+        if graphic is not None:
+            margins = self.workspace_margins
+            gw, gh = graphic.size
+            w = gw * self.graphic2lpx_transform
+            h = gh * self.graphic2lpx_transform
+            trs = self.viewport2lpx_transform * graphic.scale
+            dm = self.device_margins
+            dm.top = margins.top * trs
+            dm.bottom = margins.bottom * trs
+            dm.left = margins.left * trs
+            dm.right = margins.right * trs
         self.workspace_size.init(
-            w + self.device_margins.right + \
-                self.device_margins.left,
-            h + self.device_margins.top + \
-                self.device_margins.bottom,
+            w + self.device_margins.right + self.device_margins.left,
+            h + self.device_margins.top + self.device_margins.bottom,
         ) # in logical pixel
         # TODO: clip x,y could not be zero?
         self.graphic_clip.init(
@@ -336,6 +462,9 @@ class GraphicViewport(
             w,
             h,
         ) # in logical pixel
+        # constant part of the panned point, in graphic unit
+        self._pan_x_offset = self.graphic_clip.get_x() * self.lpx2graphic_transform
+        self._pan_y_offset = self.graphic_clip.get_y() * self.lpx2graphic_transform
         self._update_adjustements()
 
     def do_measure(
@@ -356,145 +485,280 @@ class GraphicViewport(
 
     def _update_adjustements(self) -> None:
         """Update horizontal and vertical adustements."""
-        if not self.props.hadjustment:
+        if not self.hadjustment:
             return
         self._update_hadjustement()
         self._update_vadjustement()
 
     def _update_hadjustement(self) -> None:
         """Sets all properties of the hadjustment at once."""
-        self.props.hadjustment.configure(
-            self.props.hadjustment.get_value(),  # value
+        hadj = self.hadjustment
+        width = self.get_allocated_width()
+        cfg = (
+            hadj,
+            hadj.get_value(),  # value
             - self.device_margins.left,  # lower
             self.workspace_size.width - self.device_margins.left,  # upper
             1,  # step increment
-            self.get_allocated_width() // 100,  # page increment
-            self.get_allocated_width(),  # page size
+            width // 100,  # page increment
+            width,  # page size
         )
+        # configure() emits changed, even with the same values
+        if cfg != self._hadj_cfg:
+            self._hadj_cfg = cfg
+            hadj.configure(*cfg[1:])
 
     def _update_vadjustement(self) -> None:
         """Sets all properties of the vadjustment at once."""
-        self.props.vadjustment.configure(
-            self.props.vadjustment.get_value(),  # value
+        vadj = self.vadjustment
+        height = self.get_allocated_height()
+        cfg = (
+            vadj,
+            vadj.get_value(),  # value
             - self.device_margins.top,  # lower
             self.workspace_size.height - self.device_margins.top,  # upper
             1,  # step increment
-            self.get_allocated_height() // 100,  # page increment
-            self.get_allocated_height(),  # page size
+            height // 100,  # page increment
+            height,  # page size
         )
+        if cfg != self._vadj_cfg:
+            self._vadj_cfg = cfg
+            vadj.configure(*cfg[1:])
 
     def do_snapshot(self, snap: Gtk.Snapshot) -> None:
-        xo = self.props.hadjustment.get_value()
-        yo = self.props.vadjustment.get_value()
-
-        # TODO: get this from css or preferences
-        bg_color = self.get_rgba(.4, .4, .4)
-        fg_color = self.get_rgba(.2, .2, .2)
-        gr_color = self.get_rgba(1, 1, .8)
-
-        fgbox = self.get_rect(
-            0, 0, self.get_allocated_width(), self.get_allocated_height()
-        )
-        snap.append_color(bg_color, fgbox)
-
-        if self.render is not None:
-            clip = self.get_rect(
-                (self.graphic_clip.get_x() - xo) + \
-                    (self.render.x * self.graphic2lpx_transform),
-                (self.graphic_clip.get_y() - yo) + \
-                    (self.render.y * self.graphic2lpx_transform),
-                self.render.w / self.pixel_scale,
-                self.render.h / self.pixel_scale,
+        # GObject properties are read as attributes, not through self.props
+        xo = self.hadjustment.get_value()
+        yo = self.vadjustment.get_value()
+        render = self.render
+
+        # colors and rects are reused, nodes keep a copy of them.
+        fgbox = self._fgbox
+        snap.append_node(self._bg_node)
+
+        if render is not None:
+            scale = self.graphic.scale
+            # until a render at the current scale is done,
+            # the previous one is drawn stretched to the new scale.
+            ratio = scale / self.render_scale
+            g2lpx = self.graphic2lpx_transform
+            self._clip_rect.init(
+                (self.graphic_clip.get_x() - xo) + (render.x * g2lpx),
+                (self.graphic_clip.get_y() - yo) + (render.y * g2lpx),
+                render.w * ratio * self._inv_pixel_scale,
+                render.h * ratio * self._inv_pixel_scale,
             )
-            if self.render.texture is not None:
-                snap.append_texture(self.render.texture, clip)
-            else:
-                snap.append_color(gr_color, clip)
-
-            if self.props.show_rulers:
-                self.draw_rulers(snap, fgbox, xo, yo, self.props.graphic.scale)
+            clip = self._clip_rect
+            # nothing to draw when the render is panned out of view
+            visible, area = clip.intersection(fgbox)
+            if visible:
+                texture = render.texture
+                if texture is not None:
+                    # texture could hold an alpha channel, the texture itself
+                    # keeps its whole bounds to not be rescaled, when partly
+                    # visible it is bounded by a clip node to the visible area.
+                    snap.append_color(self._pg_color, area)
+                    if area.equal(clip):
+                        snap.append_texture(texture, clip)
+                    else:
+                        snap.push_clip(area)
+                        snap.append_texture(texture, clip)
+                        snap.pop()
+                else:
+                    snap.append_color(self._gr_color, area)
+
+            if self.show_rulers:
+                self.draw_rulers(snap, fgbox, xo, yo, scale)
 
     def draw_rulers(
         self, snap: Gtk.Snapshot, clip: Graphene.Rect, xo: float, yo: float, scale
     ) -> None:
         #TODO: marker on ruler for current mouse pointer position
         # rulers background in lpx
-        snap.append_color(
-            self.get_rgba(0, 0, 0),
-            self.get_rect(0, 0, clip.get_width(), self.rulers_size.top),
-        )
-        snap.append_color(
-            self.get_rgba(0, 0, 0),
-            self.get_rect(0, 0, self.rulers_size.left, clip.get_height()),
-        )
+        snap.append_node(self._rulers_bg_node)
 
-        #TODO: drawing could be pre-cached for speed-up
-        # draw with physical pixel coordinates
-        ctx = snap.append_cairo(clip)
-        ctx.set_matrix(self.device_matrix)
+        # physical pixel dimensions
         w = clip.get_width() * self.pixel_scale
         h = clip.get_height() * self.pixel_scale
-        rw = self.rulers_size.top * self.pixel_scale
-        rh = self.rulers_size.left * self.pixel_scale
-        ctx.set_antialias(cairo.ANTIALIAS_NONE)
+        rw, rh = self._rulers_px
 
-        # rulers ticks
         #TODO: render measurement unit following unit-measure property
         tick = self.dpi / 25.4 * scale # mm ticks gap in physical px
         tick_len = 8  # ticks lenght in physical px
-        ctx.set_source_rgb(1, 1, 1)
-
-        # ticks font
-        ctx.select_font_face("sans")
-        ctx.set_font_size(10.0 * self.pixel_scale)
+        period = tick * 10  # ticks pattern repeat every ten ticks
+
+        # ticks are the same for every scroll position modulo period,
+        # they are drawn once in render nodes only translated when scrolling.
+        key = (w, h, rw, rh, tick, self.pixel_scale)
+        if key != self._rulers_key:
+            self._rulers_key = key
+            self._label_cache.clear()
+            self._rulers_nodes = (
+                self._make_ticks_node(w + period, rw, tick, tick_len, False),
+                self._make_ticks_node(h + period, rh, tick, tick_len, True),
+            )
+        hnode, vnode = self._rulers_nodes
 
         # Horizontal ruler
-        xt = tick - ((xo * self.pixel_scale) % tick)
-        index = int(xo / scale * self.lpx2viewport_transform)
-
-        while xt < w:
-            if xt < rw:
-                xt += tick
-                index += 1
-                continue
-            if (index % 10 == 0):
-                # set longer tick & draw unit value
-                lw = 2.0
-                ctx.move_to(xt + 2, rw - tick_len * lw - 4)
-                ctx.show_text(str(index))
-            else:
-                lw = 1.0
-            ctx.set_line_width(lw)
-            ctx.move_to(xt, rw)
-            ctx.line_to(xt, rw - tick_len * lw)
-            xt += tick
-            index += 1
+        major_x = math.floor(xo * self.pixel_scale / period)
+        phase_x = int(xo * self.pixel_scale - major_x * period)
+        snap.push_clip(self._ticks_h_rect)
+        snap.save()
+        self._point.x = -phase_x * self._inv_pixel_scale
+        self._point.y = 0
+        snap.translate(self._point)
+        snap.append_node(hnode)
+        snap.restore()
+        snap.pop()
 
         # vertical ruler
-        #TODO: vertical text position (use of pango to draw text)
-        yt = tick - ((yo * self.pixel_scale) % tick)
-        index = int(yo / scale * self.lpx2viewport_transform)
+        major_y = math.floor(yo * self.pixel_scale / period)
+        phase_y = int(yo * self.pixel_scale - major_y * period)
+        snap.push_clip(self._ticks_v_rect)
+        snap.save()
+        self._point.x = 0
+        self._point.y = -phase_y * self._inv_pixel_scale
+        snap.translate(self._point)
+        snap.append_node(vnode)
+        snap.restore()
+        snap.pop()
+
+        # units values of major ticks, the only part depending on the
+        # scroll position, labels are rasterized once and cached as textures.
+        inv_ps = self._inv_pixel_scale
+        rect = self._label_rect
+        get_label_texture = self._get_label_texture
+        append_texture = snap.append_texture
+        major_end = int(rw - tick_len * 2)
+        xt = float(-phase_x)
+        index = major_x * 10
+        snap.push_clip(self._ticks_h_rect)
+        while xt < w:
+            if xt >= rh:
+                texture, ascent = get_label_texture(index, False)
+                rect.init(
+                    (int(xt) + 2) * inv_ps,
+                    (major_end - 4 - ascent) * inv_ps,
+                    texture.get_width() * inv_ps,
+                    texture.get_height() * inv_ps,
+                )
+                append_texture(texture, rect)
+            xt += period
+            index += 10
+        snap.pop()
+
+        # vertical labels are rotated
+        major_end = int(rh - tick_len * 2)
+        yt = float(-phase_y)
+        index = major_y * 10
+        snap.push_clip(self._ticks_v_rect)
         while yt < h:
-            if yt < rw:
-                yt += tick
-                index += 1
-                continue
-            if (index % 10 == 0):
-                lw = 2.0
-                gw = 0  # ctx.glyph_extents(list(str(index))).width
-                ctx.move_to(rh - tick_len * lw - 4, yt - gw)
-                ctx.save()
-                ctx.rotate(-1.5708)
-                ctx.show_text(str(index))
-                ctx.restore()
-            else:
-                lw = 1.0
-            ctx.set_line_width(lw)
-            ctx.move_to(rh, yt)
-            ctx.line_to(rh - tick_len * lw, yt)
-            yt += tick
-            index += 1
-        ctx.stroke()
+            if yt >= rw:
+                texture, ascent = get_label_texture(index, True)
+                th = texture.get_height()
+                rect.init(
+                    (major_end - 4 - ascent) * inv_ps,
+                    (int(yt) - th) * inv_ps,
+                    texture.get_width() * inv_ps,
+                    th * inv_ps,
+                )
+                append_texture(texture, rect)
+            yt += period
+            index += 10
+        snap.pop()
+
+    def _get_label_texture(
+        self, index: int, vertical: bool
+    ) -> Tuple[Gdk.Texture, int]:
+        """Returns a texture of the ruler label for :obj:`index`, rotated
+        for the vertical ruler, and the ascent of its font, both
+        in physical pixel."""
+        key = (index, vertical)
+        entry = self._label_cache.get(key)
+        if entry is not None:
+            self._label_cache.move_to_end(key)
+            return entry
+
+        text = str(index)
+        scratch = cairo.Context(cairo.ImageSurface(cairo.FORMAT_ARGB32, 1, 1))
+        scratch.set_font_face(self._label_face)
+        scratch.set_font_size(10.0 * self.pixel_scale)
+        ascent, descent = scratch.font_extents()[:2]
+        ascent = math.ceil(ascent)
+        thickness = ascent + math.ceil(descent)
+        length = max(math.ceil(scratch.text_extents(text).x_advance), 1)
+        w, h = (thickness, length) if vertical else (length, thickness)
+
+        surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, w, h)
+        ctx = cairo.Context(surface)
+        ctx.set_antialias(cairo.ANTIALIAS_GOOD)
+        ctx.set_source_rgb(1, 1, 1)
+        ctx.set_font_face(self._label_face)
+        ctx.set_font_size(10.0 * self.pixel_scale)
+        if vertical:
+            ctx.translate(ascent, h)
+            ctx.rotate(-math.pi / 2)
+            ctx.move_to(0, 0)
+        else:
+            ctx.move_to(0, ascent)
+        ctx.show_text(text)
+        surface.flush()
+        texture = Gdk.MemoryTexture.new(
+            w,
+            h,
+            _CAIRO_ARGB32_FORMAT,
+            GLib.Bytes.new(surface.get_data()),
+            surface.get_stride(),
+        )
+        entry = self._label_cache[key] = (texture, ascent)
+        # only a few labels are visible at once
+        while len(self._label_cache) > 128:
+            self._label_cache.popitem(last=False)
+        return entry
+
+    def _make_ticks_node(
+        self, length: float, size: float, tick: float,
+        tick_len: int, vertical: bool,
+    ) -> Gsk.RenderNode:
+        """Build a render node with the ticks of a ruler.
+
+        Ticks are color nodes in a container node, so that they don't
+        need any cairo rasterization. The first tick, at 0, is a major one.
+        All dimensions are in physical pixel.
+        """
+        ps = self.pixel_scale
+        # ticks are snapped on the physical pixels grid, minor ticks
+        # are 1px wide from p, major ones 2px wide centered on p.
+        minor_end = int(size - tick_len)
+        major_end = int(size - tick_len * 2)
+        # all positions are generated at once, positions are positive
+        # so int() is floor(), there's no accumulated float error.
+        positions = [int(i * tick) for i in range(math.ceil(length / tick))]
+        # every tenth tick is a major one, they are split by slicing
+        # so the loops below have no per tick branch.
+        majors = positions[::10]
+        minors = positions[:]
+        del minors[::10]
+        rect = Graphene.Rect()  # copied by value in each node
+        init = rect.init
+        white = self._white
+        color_node = Gsk.ColorNode.new
+        nodes = []
+        append = nodes.append
+        for ticks, offset, lw, end in (
+            (majors, -1, 2, major_end),
+            (minors, 0, 1, minor_end),
+        ):
+            # constants of the tick class in logical pixel
+            w = lw / ps
+            e = end / ps
+            l = (size - end) / ps
+            for p in ticks:
+                if vertical:
+                    init(e, (p + offset) / ps, l, w)
+                else:
+                    init((p + offset) / ps, e, w, l)
+                append(color_node(white, rect))
+        return Gsk.ContainerNode.new(nodes)
 
     @staticmethod
     def get_rgba(r, g, b, a=1.0):
@@ -505,6 +769,13 @@ class GraphicViewport(
         color.alpha = a
         return color
 
+    @staticmethod
+    def get_point(x, y):
+        point = Graphene.Point()
+        point.x = x
+        point.y = y
+        return point
+
     @staticmethod
     def get_rect(x, y, w, h):
         rect = Graphene.Rect()
@@ -512,35 +783,59 @@ class GraphicViewport(
         return rect
 
     def draw_text(self, snap, text, x, y, color):
-        font = Pango.FontDescription.new()
-        font.set_family("Sans")
-        font.set_size(12 * Pango.SCALE)
-        context = self.get_pango_context()
-        layout = Pango.Layout(context)
-        layout.set_font_description(font)
-        point = Graphene.Point()
-        point.x = x
-        point.y = y
+        # the layout and its font are built once
+        if self._text_layout is None:
+            # Pango is only needed here, don't load it at startup
+            from gi.repository import Pango
+            font = GraphicViewport._text_font
+            if font is None:
+                # the font description is shared by all viewports
+                font = GraphicViewport._text_font = Pango.FontDescription.new()
+                font.set_family("Sans")
+                font.set_size(12 * Pango.SCALE)
+            self._text_layout = Pango.Layout(self.get_pango_context())
+            self._text_layout.set_font_description(font)
+        self._point.x = x
+        self._point.y = y
         snap.save()
-        snap.translate(point)
-        layout.set_text(text)
-        snap.append_layout(layout, color)
+        snap.translate(self._point)
+        self._text_layout.set_text(text)
+        snap.append_layout(self._text_layout, color)
         snap.restore()
 
     def draw_grid(self, snap, clip, r, g, b):
-        ctx = snap.append_cairo(clip)
-        ctx.set_matrix(cairo.Matrix(0.5, 0, 0, 0.5, 0, 0))
+        # the grid only depends on its bounds and color,
+        # it is drawn once in a render node.
+        key = (
+            clip.get_x(), clip.get_y(), clip.get_width(), clip.get_height(),
+            r, g, b,
+        )
+        if key != self._grid_key:
+            self._grid_key = key
+            self._grid_node = self._make_grid_node(clip, r, g, b)
+        snap.append_node(self._grid_node)
+
+    def _make_grid_node(self, clip, r, g, b) -> Gsk.RenderNode:
+        node = Gsk.CairoNode.new(clip)
+        ctx = node.get_draw_context()
+        ctx.set_matrix(self._grid_matrix)
         ctx.set_source_rgb(r, g, b)
         ctx.set_line_width(0.5)
-        w *= 2
-        h *= 2
+        # grid matrix is half scaled
+        w = math.ceil(clip.get_width() * 2)
+        h = math.ceil(clip.get_height() * 2)
+        # all lines in a single path, stroked once
+        move_to = ctx.move_to
+        line_to = ctx.line_to
         for sx in range(0, w, 50):
-            ctx.move_to(sx, 0)
-            ctx.line_to(sx, h)
+            move_to(sx, 0)
+            line_to(sx, h)
         for sy in range(0, h, 50):
-            ctx.move_to(0, sy)
-            ctx.line_to(w, sy)
+            move_to(0, sy)
+            line_to(w, sy)
         ctx.stroke()
+        del ctx  # drawing is done, release the node's surface
+        return node
 
     def do_get_request_mode(self) -> Gtk.SizeRequestMode:
         """Gets whether the widget prefers a height-for-width layout
@@ -555,7 +850,7 @@ class GraphicViewport(
     def do_get_border(self) -> Optional[Gtk.Border]:
         """Returns the size of a non-scrolling border around
         the outside of the scrollable."""
-        if self.props.show_rulers:
+        if self.show_rulers:
             return self.rulers_size
         return None
 
@@ -568,25 +863,80 @@ class GraphicViewport(
         and up to date.
         """
         self._update_adjustements()
+        self._update_snapshot_rects(width, height)
+
+    def _update_snapshot_rects(self, width: int, height: int) -> None:
+        # The static geometry of snapshots only depends on the allocation,
+        # scrolling just moves the render clip and the ruler ticks.
+        top = self.rulers_size.top
+        left = self.rulers_size.left
+        self._fgbox.init(0, 0, width, height)
+        self._ruler_h_rect.init(0, 0, width, top)
+        self._ruler_v_rect.init(0, 0, left, height)
+        self._ticks_h_rect.init(left, 0, width - left, top)
+        self._ticks_v_rect.init(0, top, left, height - top)
+        # background color nodes don't change between snapshots
+        self._bg_node = Gsk.ColorNode.new(self._bg_color, self._fgbox)
+        self._rulers_bg_node = Gsk.ContainerNode.new([
+            Gsk.ColorNode.new(self._black, self._ruler_h_rect),
+            Gsk.ColorNode.new(self._black, self._ruler_v_rect),
+        ])
 
     def _on_view_changed(self, adjustment: Gtk.Adjustment) -> None:
-        if self.props.graphic is not None:
-            self.props.graphic.on_panned(
-                (self.props.hadjustment.get_value() + self.graphic_clip.get_x()) * \
-                 self.lpx2graphic_transform,
-                (self.props.vadjustment.get_value() + self.graphic_clip.get_y()) * \
-                 self.lpx2graphic_transform,
+        # value-changed could be emitted by adjustments without any move,
+        # adjustment is None when the view has to be updated anyway.
+        if adjustment is not None:
+            value = adjustment.get_value()
+            if adjustment is self.hadjustment:
+                if value == self._last_hvalue:
+                    return
+                self._last_hvalue = value
+            elif adjustment is self.vadjustment:
+                if value == self._last_vvalue:
+                    return
+                self._last_vvalue = value
+        # adjustments could change many times per frame while scrolling,
+        # coalesce them in a single pan and render request when idle,
+        # just before the frame clock redraw (GDK_PRIORITY_REDRAW).
+        if self._view_changed_source is None:
+            self._view_changed_source = GLib.idle_add(
+                self._on_view_changed_idle,
+                priority=GLib.PRIORITY_HIGH_IDLE + 10,
+            )
+
+    def _on_view_changed_idle(self) -> bool:
+        self._view_changed_source = None
+        graphic = self.graphic
+        if graphic is not None:
+            lpx2g = self.lpx2graphic_transform
+            graphic.on_panned(
+                self.hadjustment.get_value() * lpx2g + self._pan_x_offset,
+                self.vadjustment.get_value() * lpx2g + self._pan_y_offset,
             )
-            # self.render = self.props.graphic.get_render()
-            self.props.graphic.get_render_async(
-                cancellable=None, callback=self._on_get_render_cb, user_data=None
+            # self.render = graphic.get_render()
+            # a render for a previous scroll position is not needed anymore
+            self._cancel_render()
+            self._render_cancellable = Gio.Cancellable()
+            graphic.get_render_async(
+                cancellable=self._render_cancellable,
+                callback=self._on_get_render_cb,
+                user_data=graphic.scale,
             )
         self.queue_draw()
+        return GLib.SOURCE_REMOVE
+
+    def _cancel_render(self) -> None:
+        if self._render_cancellable is not None:
+            self._render_cancellable.cancel()
+            self._render_cancellable = None
 
     def _on_get_render_cb(
         self, src: Graphic, result: Gio.Task, user_data: Any
     ) -> None:
-        self.render = self.props.graphic.get_render_finish(result, None)
+        if result.had_error():
+            return  # cancelled, superseded by a newer request
+        self.render = src.get_render_finish(result, None)
+        self.render_scale = user_data
         self.queue_draw()
 
     def __str__(self) -> str:
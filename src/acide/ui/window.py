@@ -14,13 +14,17 @@
 #
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
+from typing import Optional, TYPE_CHECKING
+
 import gi
 gi.require_version('Gtk', '4.0')
 gi.require_version('Adw', '1')
 
 from gi.repository import Adw, Gtk, Gio
 
-from acide.doc import Document, Page
+if TYPE_CHECKING:
+    # acide.doc imports fitz, only load it when a document is opened
+    from acide.doc import Document
 from acide.ui.surface import GraphicViewport
 
 @Gtk.Template(resource_path='/io/github/gravures/acide/gtk/AcideWindow.ui')
@@ -40,10 +44,9 @@ class AcideWindow(Gtk.ApplicationWindow):
         self.application = kwargs.get("application")
         self.connect("realize", self.on_realise_cb)
 
-        self.document: Document = None
+        self.document: Optional['Document'] = None
         self.viewport: GraphicViewport = GraphicViewport()
         self.scrolled_window.set_child(self.viewport)
-        self.viewport.queue_draw()
 
     def get_scale(self):
         display = self.get_display()
@@ -101,9 +104,9 @@ class AcideWindow(Gtk.ApplicationWindow):
         if self.document:
             self.viewport.props.graphic.scale_init()
 
-    def set_document(self, doc: Document) -> None:
+    def set_document(self, doc: Optional['Document']) -> None:
         self.document = doc
-        graphic = self.document.get_graphic()
+        graphic = self.document.get_graphic() if doc is not None else None
         self.viewport.props.graphic = graphic
 
 